@@ -2,15 +2,42 @@
 # -*- coding: utf-8 -*-
 import paho.mqtt.client as mqtt
 import json
+import os
 import random
+import sys
 import time
 import threading
 from collections import Counter
 import requests
 
+# Client Ollama du joueur (disjoncteur, modèle de secours, validation et
+# réparation des sorties), partagé avec l'arbitre
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Joueur"))
+import schemas
+from ollama_client import ClientOllama, ErreurOllama, SLO_LATENCE, SLO_LATENCE_DEFAUT
+
 # Configuration Ollama
-OLLAMA_URL = "http://10.103.1.12:11434/api/generate"
+OLLAMA_HOTE = "http://10.103.1.12:11434"
 OLLAMA_MODEL = "gemma3:4b"
+# Contexte fixe (un changement force le rechargement du modèle) et réponse bornée
+OLLAMA_NUM_CTX = 2048
+OLLAMA_NUM_PREDICT = 160
+# Temps accordé à la génération d'une défense (chaîne de secours comprise):
+# l'objectif de latence du modèle, puis défense par défaut
+DELAI_DEFENSE = SLO_LATENCE.get(OLLAMA_MODEL, SLO_LATENCE_DEFAUT)
+DEFENSE_PAR_DEFAUT = "Je ne suis pas l'espion, mes temperatures sont coherentes."
+# Schéma JSON imposé à la génération de la défense (champ "format" d'Ollama),
+# puis vérifié à la réception (ClientOllama.decoder)
+SCHEMA_DEFENSE = schemas.DEFENSE
+
+# Fenêtres de vote (secondes), transmises aux capteurs comme échéance
+DELAI_VOTE_ROUND1 = 10.0
+DELAI_VOTE_ROUND2 = 15.0
+DELAI_RELANCE_VOTE = 8.0
+
+# Source météo imposée aux capteurs: "open-meteo", "fixtures:<fichier>",
+# "synthetique[:<graine>]", "enregistreur:<fichier>" ou "sonde[:<dossier sysfs>]"
+FOURNISSEUR_METEO = "open-meteo"
 
 class ServeurArbitre:
     def __init__(self, broker_ip, nb_joueurs):
@@ -49,6 +76,15 @@ class ServeurArbitre:
         # Session HTTP pour Ollama
         self.session = requests.Session()
 
+        # Défense spéculative: générée pendant le vote round 1 pour le suspect en tête
+        self.defense_speculative = None
+        self.verrou_speculation = threading.Lock()
+
+        # Client Ollama du joueur: disjoncteur et modèle de secours, validation
+        # des sorties et taux de réparation; afficher peut être remplacée par
+        # l'interface après la construction
+        self.ollama = ClientOllama(OLLAMA_HOTE, self.session, log=lambda m: self.afficher(m))
+
     def afficher(self, message):
         """Affichage simple avec horodatage"""
         heure = time.strftime("%H:%M:%S")
@@ -116,6 +152,11 @@ class ServeurArbitre:
         self.votes_round1.clear()
         self.votes_round2.clear()
         self.awaiting_second_vote = False
+        self.abandonner_speculation()
+
+        # Annoncer les villes possibles: les capteurs préchargent leur météo
+        partie = {"villes": self.pool_villes, "nb_rounds": self.nb_rounds, "meteo": FOURNISSEUR_METEO}
+        self.client.publish("iot/partie", json.dumps(partie, ensure_ascii=False), qos=1)
 
         # Choisir l'espion au hasard
         ids_capteurs = list(self.capteurs_connectes.keys())
@@ -191,17 +232,9 @@ class ServeurArbitre:
             # Si c'est le dernier round, demander le vote initial
             if self.round_actuel >= self.nb_rounds:
                 self.afficher("[INFO] Dernier round termine! En attente des votes...")
-                # Demander aux clients d'envoyer le vote initial
-                self.client.publish("iot/demande_vote", "vote", qos=1)
+                # Demander aux clients d'envoyer le vote initial (avec timer de clôture)
+                self.demander_votes(1, DELAI_VOTE_ROUND1)
                 self.afficher("[INFO] Demande de vote envoyee aux capteurs (round 1)")
-                # lancer timer pour clôture vote round1
-                if self.timer_votes:
-                    try:
-                        self.timer_votes.cancel()
-                    except:
-                        pass
-                self.timer_votes = threading.Timer(10.0, self.cloturer_votes)
-                self.timer_votes.start()
             else:
                 # Démarrer le prochain round après 2 secondes
                 threading.Timer(2.0, self.demarrer_round).start()
@@ -233,6 +266,9 @@ class ServeurArbitre:
                             pass
                     self.afficher("[VOTES] Tous les votes (round 1) recus!")
                     threading.Timer(0.1, self.traiter_votes_round1).start()
+                else:
+                    # Anticiper la défense du suspect en tête pendant l'attente
+                    self.speculer_defense()
             else:
                 # Round 2
                 self.votes_round2[capteur_id] = espion_presume
@@ -261,11 +297,9 @@ class ServeurArbitre:
             self.afficher(f"[TIMEOUT] Round1 - Votes manquants de: {', '.join(manquants)}")
             # relance une fois
             if manquants:
-                self.client.publish("iot/demande_vote", "vote", qos=1)
-                self.afficher("[INFO] Relance demande de vote envoyee (round 1)")
                 # on donne encore un peu de temps : relancer timer
-                self.timer_votes = threading.Timer(8.0, self.cloturer_votes)
-                self.timer_votes.start()
+                self.demander_votes(1, DELAI_RELANCE_VOTE)
+                self.afficher("[INFO] Relance demande de vote envoyee (round 1)")
                 return
 
             # si pas assez de votes, on annule
@@ -279,10 +313,8 @@ class ServeurArbitre:
             manquants = set(self.capteurs_connectes.keys()) - set(self.votes_round2.keys())
             self.afficher(f"[TIMEOUT] Round2 - Votes manquants de: {', '.join(manquants)}")
             if manquants:
-                self.client.publish("iot/demande_vote", "vote", qos=1)
+                self.demander_votes(2, DELAI_RELANCE_VOTE)
                 self.afficher("[INFO] Relance demande de vote envoyee (round 2)")
-                self.timer_votes = threading.Timer(8.0, self.cloturer_votes)
-                self.timer_votes.start()
                 return
 
             if len(self.votes_round2) < max(2, len(self.capteurs_connectes) // 2):
@@ -292,6 +324,27 @@ class ServeurArbitre:
             else:
                 self.traiter_votes_round2()
 
+    def demander_votes(self, vote_round, delai):
+        """Publie la demande de vote avec son échéance et arme le timer de clôture
+
+        Le message porte l'échéance absolue (epoch) et le délai relatif: les
+        capteurs s'en servent pour borner leurs appels au LLM.
+        """
+        demande = {
+            "type": "vote" if vote_round == 1 else "vote_round2",
+            "round": vote_round,
+            "delai": delai,
+            "echeance": time.time() + delai
+        }
+        self.client.publish("iot/demande_vote", json.dumps(demande), qos=1)
+        if self.timer_votes:
+            try:
+                self.timer_votes.cancel()
+            except:
+                pass
+        self.timer_votes = threading.Timer(delai, self.cloturer_votes)
+        self.timer_votes.start()
+
     # ===== traitement vote round1 =====
 
     def traiter_votes_round1(self):
@@ -315,8 +368,10 @@ class ServeurArbitre:
             temps_str = ", ".join([f"R{t['round']}: {t['temperature']}°C ({t['ville']})" for t in temps])
             self.afficher(f"  - {capteur_id}: {temps_str}")
 
-        # Générer la défense avec Ollama pour l'accusé
-        defense_text = self.generer_defense_ollama(accuse_id)
+        # Générer la défense avec Ollama pour l'accusé (ou reprendre celle anticipée)
+        defense_text = self.recuperer_defense_speculative(accuse_id)
+        if defense_text is None:
+            defense_text = self.generer_defense_ollama(accuse_id)
 
         # Publier la défense sur le topic iot/defense (les capteurs attendent ce message)
         payload = {"capteur_id": accuse_id, "defense": defense_text}
@@ -329,16 +384,8 @@ class ServeurArbitre:
 
         # Demander second vote aux capteurs
         time.sleep(1.0)
-        self.client.publish("iot/demande_vote", "vote_round2", qos=1)
+        self.demander_votes(2, DELAI_VOTE_ROUND2)
         self.afficher("[INFO] Demande de vote envoyee aux capteurs (round 2)")
-        # lancer timer pour clôture du round2
-        if self.timer_votes:
-            try:
-                self.timer_votes.cancel()
-            except:
-                pass
-        self.timer_votes = threading.Timer(15.0, self.cloturer_votes)
-        self.timer_votes.start()
 
     # ===== traitement vote round2 =====
 
@@ -389,6 +436,7 @@ class ServeurArbitre:
 
         self.client.publish("iot/resultats", json.dumps(resultats, ensure_ascii=False), qos=1)
         self.afficher("[PUBLICATION] Resultats publies (final)")
+        self.rapport_sorties_defense()
 
         # Reset mais sans relancer automatiquement
         self.jeu_actif = False
@@ -401,18 +449,98 @@ class ServeurArbitre:
         
         self.afficher("[INFO] Partie terminée. Appuyez sur R pour relancer une partie")
 
+    # ===== Défense spéculative =====
+
+    def leader_probable(self):
+        """Retourne le suspect en tête du round 1 s'il se détache nettement, sinon None"""
+        compteur = Counter(self.votes_round1.values())
+        classement = compteur.most_common(2)
+        if not classement:
+            return None
+        leader, nb = classement[0]
+        second = classement[1][1] if len(classement) > 1 else 0
+        # Au moins la moitié des votes reçus et une avance stricte sur le second
+        if len(self.votes_round1) * 2 < len(self.capteurs_connectes) or nb <= second:
+            return None
+        return leader
+
+    def speculer_defense(self):
+        """Lance (ou relance) en arrière-plan la défense du suspect en tête"""
+        leader = self.leader_probable()
+        with self.verrou_speculation:
+            spec = self.defense_speculative
+            if spec and spec["accuse"] == leader:
+                return
+            if spec:
+                spec["annulee"] = True
+                self.afficher(f"[SPECULATION] Leader change ({spec['accuse']} -> {leader}), defense abandonnee")
+            self.defense_speculative = None
+            if leader is None:
+                return
+            spec = {"accuse": leader, "defense": None, "annulee": False, "prete": threading.Event()}
+            self.defense_speculative = spec
+
+        self.afficher(f"[SPECULATION] Generation anticipee de la defense de {leader}")
+        threading.Thread(target=self._generer_defense_speculative, args=(spec,), daemon=True).start()
+
+    def _generer_defense_speculative(self, spec):
+        try:
+            spec["defense"] = self.generer_defense_ollama(spec["accuse"], est_annulee=lambda: spec["annulee"],
+                                                          speculatif=True)
+        finally:
+            spec["prete"].set()
+
+    def recuperer_defense_speculative(self, accuse_id):
+        """Retourne la défense anticipée si elle concerne l'accusé final, sinon None"""
+        with self.verrou_speculation:
+            spec = self.defense_speculative
+            self.defense_speculative = None
+        if not spec:
+            return None
+        if spec["accuse"] != accuse_id:
+            spec["annulee"] = True
+            self.afficher(f"[SPECULATION] Prediction ratee ({spec['accuse']} au lieu de {accuse_id})")
+            return None
+
+        # La génération est peut-être encore en cours: l'attendre coûte moins que tout relancer
+        spec["prete"].wait()
+        if spec["defense"] is None:
+            return None
+        self.afficher(f"[SPECULATION] Defense anticipee utilisee pour {accuse_id}")
+        return spec["defense"]
+
+    def abandonner_speculation(self):
+        """Invalide toute défense spéculative en cours (nouvelle partie, annulation)
+
+        Une requête déjà envoyée à Ollama n'est pas interrompue: elle va à son
+        terme et son résultat est ignoré. Comme elle est spéculative, son échec
+        éventuel ne change pas l'état du disjoncteur (la vraie défense n'est
+        donc pas privée d'Ollama à cause d'elle).
+        """
+        with self.verrou_speculation:
+            if self.defense_speculative:
+                self.defense_speculative["annulee"] = True
+            self.defense_speculative = None
+
     # ===== Ollama integration pour générer une defense =====
 
-    def generer_defense_ollama(self, accuse_id):
-        """Appelle Ollama pour générer une défense courte pour l'accusé"""
+    def generer_defense_ollama(self, accuse_id, est_annulee=None, speculatif=False):
+        """Appelle Ollama pour générer une défense courte pour l'accusé
+
+        est_annulee: callable optionnel; si elle renvoie True avant l'envoi, on
+        retourne None sans appeler Ollama (défense spéculative abandonnée).
+        Tout échec (modèles indisponibles, délai DELAI_DEFENSE dépassé, sortie
+        invalide) donne aussitôt DEFENSE_PAR_DEFAUT.
+        speculatif: défense anticipée; son appel n'agit pas sur le disjoncteur.
+        """
         # Build prompt
         prompt_lines = [
             "Tu es un assistant neutre qui rédige une courte défense pour un capteur accusé d'être un espion.",
             f"Accuse: {accuse_id}",
-            "Voici les temperatures recueillies (par capteur et round):"
+            "Voici les temperatures recueillies en °C (par capteur et round):"
         ]
         for cid, temps in sorted(self.temperatures.items()):
-            temps_repr = ", ".join([f"R{t['round']}={t['temperature']}°C" for t in temps])
+            temps_repr = " ".join([f"R{t['round']}={t['temperature']}" for t in temps])
             prompt_lines.append(f"- {cid}: {temps_repr}")
 
         prompt_lines.append(
@@ -423,94 +551,33 @@ class ServeurArbitre:
 
         self.afficher(f"[OLLAMA] Préparation requête de défense pour {accuse_id}")
 
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "format": "json",
-            "stream": False,
-            "options": {"temperature": 0.0}
-        }
+        if est_annulee and est_annulee():
+            self.afficher(f"[OLLAMA] Generation abandonnee pour {accuse_id}")
+            return None
 
-        max_attempts = 3
-        backoff = 1.0
-        for attempt in range(1, max_attempts + 1):
-            t0 = time.time()
-            try:
-                self.afficher(f"[OLLAMA] Attempt {attempt}/{max_attempts} - envoi (prompt {len(prompt)} bytes)")
-                resp = self.session.post(OLLAMA_URL, json=payload, timeout=30)
-                elapsed = time.time() - t0
-                status = resp.status_code
-                text = resp.text or ""
-                # Truncate long responses in logs
-                short_text = text[:2000] + ("...(truncated)" if len(text) > 2000 else "")
-                self.afficher(f"[OLLAMA] HTTP {status} en {elapsed:.2f}s - réponse (troncée): {short_text}")
-
-                if status != 200:
-                    self.afficher(f"[OLLAMA][WARN] Statut inattendu {status}, attempt={attempt}")
-                    # retry with backoff
-                    if attempt < max_attempts:
-                        time.sleep(backoff)
-                        backoff *= 2
-                        continue
-                    else:
-                        break
-
-                # Parse JSON response from Ollama API
-                try:
-                    result = resp.json()
-                except Exception as e:
-                    self.afficher(f"[OLLAMA][ERROR] JSON decode failed: {e}")
-                    # include raw text as fallback
-                    result = {"response": text}
-
-                # Ollama returns 'response' string when stream=False; it may contain JSON
-                response_text = ""
-                if isinstance(result, dict):
-                    response_text = (result.get("response") or result.get("result") or "").strip()
-                elif isinstance(result, str):
-                    response_text = result.strip()
-                else:
-                    response_text = str(result)
-
-                # Try to parse the model output as JSON
-                defense = None
-                if response_text:
-                    try:
-                        parsed = json.loads(response_text)
-                        if isinstance(parsed, dict):
-                            defense = parsed.get("defense") or parsed.get("message") or None
-                        else:
-                            defense = str(parsed)
-                    except Exception:
-                        # Not JSON: use the raw response_text
-                        defense = response_text
-
-                # Final cleanup
-                if defense is None:
-                    defense = "Je ne suis pas l'espion, mes temperatures sont coherentes."
-                elif not isinstance(defense, str):
-                    defense = str(defense)
-
-                defense = defense.strip().strip('"')
-                self.afficher(f"[OLLAMA] Defense recuperee (len={len(defense)}): {defense[:1000]}{('...') if len(defense)>1000 else ''}")
-                return defense
-
-            except requests.RequestException as e:
-                elapsed = time.time() - t0
-                self.afficher(f"[OLLAMA][ERROR] Request failed (attempt {attempt}) after {elapsed:.2f}s: {e}")
-                if attempt < max_attempts:
-                    time.sleep(backoff)
-                    backoff *= 2
-                    continue
-                else:
-                    break
-            except Exception as e:
-                self.afficher(f"[OLLAMA][ERROR] Unexpected error: {e}")
-                break
-
-        # If we reach here, all attempts failed
-        self.afficher("[OLLAMA][ERROR] Echec de generation apres plusieurs tentatives")
-        return "Je ne suis pas l'espion, mes temperatures sont coherentes."
+        # Un seul appel borné à l'objectif de latence: le disjoncteur du client
+        # bascule sur le modèle de secours ou refuse l'appel tout de suite
+        options = {"temperature": 0.0, "num_ctx": OLLAMA_NUM_CTX, "num_predict": OLLAMA_NUM_PREDICT}
+        t0 = time.time()
+        try:
+            self.afficher(f"[OLLAMA] Envoi (prompt {len(prompt)} bytes)")
+            defense = self.ollama.generer_json(OLLAMA_MODEL, prompt, SCHEMA_DEFENSE, options=options,
+                                               echeance=t0 + DELAI_DEFENSE, speculatif=speculatif)["defense"]
+        except ErreurOllama as e:
+            self.afficher(f"[OLLAMA][ERROR] Echec apres {time.time() - t0:.2f}s ({e}), defense par defaut")
+            return DEFENSE_PAR_DEFAUT
+
+        defense = defense.strip().strip('"')
+        self.afficher(f"[OLLAMA] Defense recuperee (len={len(defense)}): {defense[:1000]}{('...') if len(defense)>1000 else ''}")
+        return defense
+
+    def rapport_sorties_defense(self):
+        """Affiche, par modèle, les taux de sorties de défense réparées et invalides"""
+        for modele, stats in sorted(self.ollama.sorties.items()):
+            if stats["appels"]:
+                self.afficher(f"[OLLAMA] Sorties de defense {modele}: {stats['appels']} dont "
+                              f"{stats['reparees'] / stats['appels']:.0%} reparees, "
+                              f"{self.ollama.taux_invalides(modele):.0%} invalides")
 
     def fin_manche(self, gagnant, accuse):
         """Termine la partie et prépare la suivante (utilisé en cas d'annulation)"""
@@ -526,6 +593,7 @@ class ServeurArbitre:
         }
         self.client.publish("iot/resultats", json.dumps(resultats, ensure_ascii=False), qos=1)
         self.afficher("[PUBLICATION] Resultats publies (annulation ou cas particulier)")
+        self.rapport_sorties_defense()
 
         # Réinitialiser
         self.jeu_actif = False
@@ -535,6 +603,7 @@ class ServeurArbitre:
         self.votes_round1.clear()
         self.votes_round2.clear()
         self.awaiting_second_vote = False
+        self.abandonner_speculation()
 
         self.afficher("[INFO] Prochaine partie dans 15 secondes...\n")
         threading.Timer(15.0, self.demarrer_jeu).start()
@@ -1,3 +1,4 @@
+import functools
 import pygame
 import sys
 from arbitreIA import ServeurArbitre
@@ -10,6 +11,49 @@ import tkinter as tk
 from tkinter import simpledialog
 import os
 
+# Boucle d'affichage pilotée par les événements: 60 FPS pendant une modale,
+# FPS_ANIMATION pour le balancement des joueurs (si ANIMATION_JOUEURS), sinon
+# redessin seulement sur changement d'état (réveil au plus tard après
+# DELAI_VEILLE_MS): l'arbitre reste au repos pendant les attentes du LLM
+ANIMATION_JOUEURS = False
+FPS_MODALE = 60
+FPS_ANIMATION = 20
+DELAI_VEILLE_MS = 500
+EVENEMENT_ETAT = pygame.USEREVENT + 1
+
+# Voiles et panneaux translucides: une surface opaque mise en cache par
+# (taille, couleur, forme), rendue translucide par son alpha de surface.
+# Les fondus sont ramenés à PAS_FONDU niveaux; on ne garde pas une copie à
+# alpha par pixel par niveau (4 Mo chacune en plein écran)
+PAS_FONDU = 20
+COULEUR_TRANSPARENTE = (255, 0, 255)
+
+
+def niveau_fondu(fondu):
+    """Fondu (0..1) ramené au niveau de PAS_FONDU le plus proche"""
+    return round(max(0.0, min(1.0, fondu)) * PAS_FONDU) / PAS_FONDU
+
+
+@functools.lru_cache(maxsize=32)
+def voile(largeur, hauteur, couleur, rayon=0, epaisseur=0):
+    """Rectangle (arrondi ou simple bordure) opaque; le reste est transparent par colorkey.
+
+    La surface est partagée: fixer set_alpha juste avant chaque blit (dessiner_voile).
+    """
+    surf = pygame.Surface((largeur, hauteur)).convert()
+    if rayon or epaisseur:
+        surf.fill(COULEUR_TRANSPARENTE)
+        surf.set_colorkey(COULEUR_TRANSPARENTE)
+    pygame.draw.rect(surf, couleur, (0, 0, largeur, hauteur), width=epaisseur, border_radius=rayon)
+    return surf
+
+
+def dessiner_voile(ecran, position, taille, couleur, alpha, rayon=0, epaisseur=0):
+    """Blit d'un voile mis en cache avec l'alpha demandé (0-255)"""
+    surf = voile(taille[0], taille[1], couleur, rayon, epaisseur)
+    surf.set_alpha(alpha)
+    ecran.blit(surf, position)
+
 class AmongUsPlayer:
     def __init__(self, color, x, y, scale=1.0):
         self.color = color
@@ -76,6 +120,8 @@ class ArbitreDisplay:
         self.stars = [(random.randint(0, self.WIDTH), 
                       random.randint(0, self.HEIGHT), 
                       random.random()*2) for _ in range(100)]
+        self.fond = None  # fond étoilé pré-rendu (draw_space_background)
+        self.panneaux = {}  # fonds de sections et du panneau IA pré-rendus
         
         # Polices
         self.font_title = pygame.font.Font(None, 48)
@@ -106,6 +152,11 @@ class ArbitreDisplay:
 
         self.ai_dialogue = []
         self.max_ai_lines = 4
+
+        # Version de l'état affiché, incrémentée par le serveur (custom_print)
+        # et par les changements détectés dans update_game_state
+        self.version_etat = 0
+        self.etat_precedent = None
         
         # Démarrage du serveur
         self.serveur = ServeurArbitre(broker_ip, nb_joueurs)
@@ -132,16 +183,19 @@ class ArbitreDisplay:
         self.font_analysis = pygame.font.Font(None, 32)
 
     def draw_section(self, title, section, alpha=192):
-        """Dessine une section avec fond semi-transparent"""
-        section_surface = pygame.Surface((section['w'], section['h']), pygame.SRCALPHA)
-        pygame.draw.rect(section_surface, (0, 0, 0, alpha), 
-                        (0, 0, section['w'], section['h']))
-        
-        # Titre
-        title_surface = self.font_title.render(title, True, (255, 255, 255))
-        section_surface.blit(title_surface, (10, 10))
+        """Dessine une section avec fond semi-transparent (fond et titre rendus une fois)"""
+        cle = (title, section['w'], section['h'], alpha)
+        if cle not in self.panneaux:
+            section_surface = pygame.Surface((section['w'], section['h']), pygame.SRCALPHA)
+            pygame.draw.rect(section_surface, (0, 0, 0, alpha), 
+                            (0, 0, section['w'], section['h']))
+            
+            # Titre
+            title_surface = self.font_title.render(title, True, (255, 255, 255))
+            section_surface.blit(title_surface, (10, 10))
+            self.panneaux[cle] = section_surface
         
-        self.screen.blit(section_surface, (section['x'], section['y']))
+        self.screen.blit(self.panneaux[cle], (section['x'], section['y']))
         return 50  # Retourne la hauteur après le titre
 
     def draw_console(self):
@@ -157,10 +211,13 @@ class ArbitreDisplay:
             y_offset += 20
 
     def draw_space_background(self):
-        """Dessine le fond spatial avec étoiles"""
-        self.screen.fill((8, 8, 24))
-        for x, y, size in self.stars:
-            pygame.draw.circle(self.screen, (255, 255, 255), (int(x), int(y)), int(size))
+        """Dessine le fond spatial avec étoiles (rendu une seule fois, puis copié)"""
+        if self.fond is None:
+            self.fond = pygame.Surface((self.WIDTH, self.HEIGHT)).convert()
+            self.fond.fill((8, 8, 24))
+            for x, y, size in self.stars:
+                pygame.draw.circle(self.fond, (255, 255, 255), (int(x), int(y)), int(size))
+        self.screen.blit(self.fond, (0, 0))
 
     def create_player_positions(self):
         """Crée les positions des joueurs en cercle"""
@@ -216,6 +273,15 @@ class ArbitreDisplay:
         """Fonction d'affichage personnalisée pour le serveur"""
         self.message_queue.put(message)
         print(message)
+        self.marquer_modifie()
+
+    def marquer_modifie(self):
+        """Signale un changement d'état et réveille la boucle d'affichage (thread-safe)"""
+        self.version_etat += 1
+        try:
+            pygame.event.post(pygame.event.Event(EVENEMENT_ETAT))
+        except pygame.error:
+            pass  # file pleine ou affichage fermé: rattrapé par DELAI_VEILLE_MS
 
     def draw_game_over(self):
         """Affiche l'écran de fin de partie"""
@@ -223,9 +289,7 @@ class ArbitreDisplay:
             return
 
         # Overlay semi-transparent
-        overlay = pygame.Surface((self.WIDTH, self.HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 128))
-        self.screen.blit(overlay, (0, 0))
+        dessiner_voile(self.screen, (0, 0), (self.WIDTH, self.HEIGHT), (0, 0, 0), 128)
 
         # Titre "Partie Terminée"
         title = self.font_title.render("Partie Terminée!", True, (255, 255, 255))
@@ -243,9 +307,18 @@ class ArbitreDisplay:
         controls_rect = controls.get_rect(center=(self.WIDTH // 2, self.HEIGHT - 40))
         self.screen.blit(controls, controls_rect)
 
-    def handle_events(self):
-        """Gère les événements clavier"""
-        for event in pygame.event.get():
+    def handle_events(self, attente_ms=0):
+        """Gère les événements clavier
+
+        attente_ms: attend au plus ce délai le premier événement (0: n'attend pas)
+        """
+        evenements = pygame.event.get()
+        if not evenements and attente_ms > 0:
+            evenements = [pygame.event.wait(attente_ms)] + pygame.event.get()
+        for event in evenements:
+            if event.type in (pygame.VIDEOEXPOSE, getattr(pygame, "WINDOWEXPOSED", pygame.VIDEOEXPOSE)):
+                self.version_etat += 1
+
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -258,6 +331,7 @@ class ArbitreDisplay:
                 elif event.key == pygame.K_r and self.game_over:
                     # Redémarrer une nouvelle partie
                     self.game_over = False
+                    self.version_etat += 1
                     self.serveur.demarrer_jeu()
 
     def update_game_state(self):
@@ -278,6 +352,13 @@ class ArbitreDisplay:
             # round2 overrides round1 if same voter
             combined.update(self.serveur.votes_round2)
         self.votes = combined
+
+        # Changements non annoncés par un message du serveur
+        etat = (tuple(self.connected_players), self.current_round, self.spy, self.game_over,
+                tuple(self.votes.items()))
+        if etat != self.etat_precedent:
+            self.etat_precedent = etat
+            self.version_etat += 1
         
         while not self.message_queue.empty():
             message = self.message_queue.get()
@@ -293,7 +374,7 @@ class ArbitreDisplay:
                         defense_text = parts[2].strip()
                         # Extraire l'ID du joueur qui se défend (à adapter selon le format du message)
                         player_id = message.split("[OLLAMA] Defense pour ")[1].split(":")[0]
-                        self.defense_modal = DefenseModal(player_id, defense_text)
+                        self.defense_modal = DefenseModal(player_id, defense_text, self.font_defense)
                         # L'analyse suivra après un délai
                         self.modal_fade_in = 0
                         threading.Timer(6.5, self.show_analysis_modal, args=[defense_text]).start()
@@ -303,8 +384,11 @@ class ArbitreDisplay:
     def show_analysis_modal(self, defense_text):
         """Affiche la modale d'analyse après la défense"""
         analysis = f"Analyse de la défense : {defense_text}"  # À personnaliser
+        # Appelé par un Timer: sans police, la mise en page se fera au premier
+        # draw, sur le thread principal (pygame n'y est utilisé que là)
         self.analysis_modal = AnalysisModal(analysis)
         self.modal_fade_in = 0
+        self.marquer_modifie()
 
     def draw_ai_panel(self):
         """Dessine un petit panneau IA (avatar + dialogue) en bas à droite"""
@@ -314,51 +398,71 @@ class ArbitreDisplay:
         x = self.WIDTH - box_w - margin
         y = self.HEIGHT - box_h - margin
 
-        # surface semi-transparente
-        surf = pygame.Surface((box_w, box_h), pygame.SRCALPHA)
-        pygame.draw.rect(surf, (10, 12, 20, 220), (0, 0, box_w, box_h), border_radius=8)
-
-        # avatar area
         avatar_x = 12
         avatar_y = 12
-        if self.ai_avatar:
-            surf.blit(self.ai_avatar, (avatar_x, avatar_y))
-        else:
-            # fallback: draw a small robot circle
-            pygame.draw.circle(surf, (120, 180, 240), (avatar_x + 32, avatar_y + 32), 30)
-            pygame.draw.circle(surf, (255, 255, 255), (avatar_x + 22, avatar_y + 24), 6)
-            pygame.draw.circle(surf, (255, 255, 255), (avatar_x + 42, avatar_y + 24), 6)
-
-        # Title
-        title_surf = self.font_normal.render("Arbitre IA", True, (220, 220, 255))
-        surf.blit(title_surf, (avatar_x + 72, avatar_y + 6))
+
+        # fond, avatar et titre: rendus une seule fois
+        if "ia" not in self.panneaux:
+            # surface semi-transparente
+            surf = pygame.Surface((box_w, box_h), pygame.SRCALPHA)
+            pygame.draw.rect(surf, (10, 12, 20, 220), (0, 0, box_w, box_h), border_radius=8)
+
+            # avatar area
+            if self.ai_avatar:
+                surf.blit(self.ai_avatar, (avatar_x, avatar_y))
+            else:
+                # fallback: draw a small robot circle
+                pygame.draw.circle(surf, (120, 180, 240), (avatar_x + 32, avatar_y + 32), 30)
+                pygame.draw.circle(surf, (255, 255, 255), (avatar_x + 22, avatar_y + 24), 6)
+                pygame.draw.circle(surf, (255, 255, 255), (avatar_x + 42, avatar_y + 24), 6)
+
+            # Title
+            title_surf = self.font_normal.render("Arbitre IA", True, (220, 220, 255))
+            surf.blit(title_surf, (avatar_x + 72, avatar_y + 6))
+            self.panneaux["ia"] = surf
+
+        # Blit panel to screen
+        self.screen.blit(self.panneaux["ia"], (x, y))
 
         # Dialogue lines
-        line_y = avatar_y + 40
+        line_y = y + avatar_y + 40
         for i, line in enumerate(self.ai_dialogue[-self.max_ai_lines:]):
             # wrap long lines to fit roughly
             text = line
             text_surf = self.font_small.render(text, True, (235, 235, 235))
-            surf.blit(text_surf, (avatar_x + 72, line_y + i * 24))
-
-        # Blit panel to screen
-        self.screen.blit(surf, (x, y))
+            self.screen.blit(text_surf, (x + avatar_x + 72, line_y + i * 24),
+                             area=pygame.Rect(0, 0, box_w - avatar_x - 72, text_surf.get_height()))
 
     def run(self):
         """Boucle principale"""
         clock = pygame.time.Clock()
+        version_dessinee = None
         
         while True:
-            self.handle_events()  # Gestion des événements
+            modale = self.defense_modal or self.analysis_modal
+            animation = ANIMATION_JOUEURS and bool(self.player_objects) and not self.game_over
+            if modale:
+                attente = 0
+            elif animation:
+                attente = 1000 // FPS_ANIMATION
+            else:
+                attente = DELAI_VEILLE_MS
+            self.handle_events(attente)  # Gestion des événements
             
             # Mise à jour de l'état
             self.update_game_state()
             if not self.player_objects or len(self.player_objects) != len(self.connected_players):
                 self.create_player_positions()
+                self.version_etat += 1
+
+            # Rien n'a changé et rien ne bouge: pas de redessin
+            if not modale and not animation and version_dessinee == self.version_etat:
+                continue
+            version_dessinee = self.version_etat
 
-            # Animation si le jeu n'est pas terminé
-            if not self.game_over:
-                self.animation_time += 0.05
+            # Animation si le jeu n'est pas terminé (vitesse indépendante de la cadence)
+            if animation:
+                self.animation_time = time.time() * 3
                 for player in self.player_objects.values():
                     player.animation_offset = self.animation_time
 
@@ -388,130 +492,131 @@ class ArbitreDisplay:
             if self.defense_modal:
                 self.modal_fade_in = min(1.0, self.modal_fade_in + 0.05)
                 self.defense_modal.draw(self.screen, self.WIDTH, self.HEIGHT, 
-                                  self.modal_fade_in, self.font_defense)
+                                  niveau_fondu(self.modal_fade_in), self.font_defense)
                 if self.defense_modal.should_close():
                     self.defense_modal = None
+                    self.marquer_modifie()  # effacer la modale au prochain tour
         
             elif self.analysis_modal:
                 self.modal_fade_in = min(1.0, self.modal_fade_in + 0.05)
                 self.analysis_modal.draw(self.screen, self.WIDTH, self.HEIGHT, 
-                                   self.modal_fade_in, self.font_analysis)
+                                   niveau_fondu(self.modal_fade_in), self.font_analysis)
                 if self.analysis_modal.should_close():
                     self.analysis_modal = None
+                    self.marquer_modifie()  # effacer la modale au prochain tour
 
             pygame.display.flip()
-            clock.tick(60)
+            clock.tick(FPS_MODALE if modale else FPS_ANIMATION)
+
+def couper_lignes(texte, police, largeur_max):
+    """Découpe un texte en lignes d'au plus largeur_max pixels (une mesure par mot)"""
+    espace = police.size(' ')[0]
+    lignes, courante, largeur = [], [], 0
+    for mot in texte.split():
+        l_mot = police.size(mot)[0]
+        if courante and largeur + espace + l_mot > largeur_max:
+            lignes.append(' '.join(courante))
+            courante, largeur = [], 0
+        largeur += (espace if courante else 0) + l_mot
+        courante.append(mot)
+    lignes.append(' '.join(courante))
+    return lignes
+
+
+def mettre_en_page(taille, police, titre, couleur_titre, y_titre, texte, couleur, y_texte, interligne):
+    """Titre et texte centrés rendus une fois sur une surface transparente"""
+    largeur, hauteur = taille
+    surf = pygame.Surface(taille, pygame.SRCALPHA)
+    rendu = police.render(titre, True, couleur_titre)
+    surf.blit(rendu, rendu.get_rect(center=(largeur // 2, y_titre)))
+    y = y_texte
+    for ligne in couper_lignes(texte, police, largeur - 60):
+        if y - interligne > hauteur:
+            break  # hors de la fenêtre: inutile de rendre la suite
+        rendu = police.render(ligne, True, couleur)
+        surf.blit(rendu, rendu.get_rect(center=(largeur // 2, y)))
+        y += interligne
+    return surf
+
 
 class DefenseModal:
-    def __init__(self, player_id, defense_text):
+    taille = (800, 300)
+
+    def __init__(self, player_id, defense_text, font_defense=None):
         self.player_id = player_id
         self.defense_text = defense_text
         self.creation_time = time.time()
         self.display_duration = 6.0  # Durée d'affichage en secondes
+        self.contenu = None
+        if font_defense:
+            self.mettre_en_page(font_defense)
+
+    def mettre_en_page(self, font_defense):
+        """Titre et texte découpés et rendus une seule fois"""
+        self.contenu = mettre_en_page(self.taille, font_defense,
+                                      f"Défense de {self.player_id}", (220, 220, 255), 50,
+                                      self.defense_text, (255, 255, 255), 100, 40)
         
     def should_close(self):
         return time.time() - self.creation_time > self.display_duration
         
     def draw(self, screen, width, height, alpha, font_defense):
+        if self.contenu is None:
+            self.mettre_en_page(font_defense)
+
         # Fond semi-transparent noir
-        overlay = pygame.Surface((width, height), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, int(128 * alpha)))
-        screen.blit(overlay, (0, 0))
+        dessiner_voile(screen, (0, 0), (width, height), (0, 0, 0), int(128 * alpha))
         
         # Fenêtre de défense
-        modal_w, modal_h = 800, 300
+        modal_w, modal_h = self.taille
         modal_x = (width - modal_w) // 2
         modal_y = (height - modal_h) // 2
         
         # Fond de la modale avec effet de brillance
-        modal = pygame.Surface((modal_w, modal_h), pygame.SRCALPHA)
-        pygame.draw.rect(modal, (30, 30, 50, int(230 * alpha)), 
-                        (0, 0, modal_w, modal_h), border_radius=15)
-        
-        # Titre avec effet
-        title = font_defense.render(f"Défense de {self.player_id}", True, (220, 220, 255))
-        title_rect = title.get_rect(center=(modal_w//2, 50))
-        modal.blit(title, title_rect)
-        
-        # Texte de défense
-        words = self.defense_text.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            current_line.append(word)
-            test_line = ' '.join(current_line)
-            if font_defense.size(test_line)[0] > modal_w - 60:
-                current_line.pop()
-                lines.append(' '.join(current_line))
-                current_line = [word]
-        lines.append(' '.join(current_line))
-        
-        y = 100
-        for line in lines:
-            text = font_defense.render(line, True, (255, 255, 255))
-            text_rect = text.get_rect(center=(modal_w//2, y))
-            modal.blit(text, text_rect)
-            y += 40
-        
-        screen.blit(modal, (modal_x, modal_y))
+        dessiner_voile(screen, (modal_x, modal_y), (modal_w, modal_h), (30, 30, 50),
+                       int(230 * alpha), rayon=15)
+        screen.blit(self.contenu, (modal_x, modal_y))
 
 class AnalysisModal:
-    def __init__(self, analysis_text):
+    taille = (700, 250)
+
+    def __init__(self, analysis_text, font_analysis=None):
         self.analysis_text = analysis_text
         self.creation_time = time.time()
         self.display_duration = 5.0
+        self.contenu = None
+        if font_analysis:
+            self.mettre_en_page(font_analysis)
+
+    def mettre_en_page(self, font_analysis):
+        """Titre et texte découpés et rendus une seule fois"""
+        self.contenu = mettre_en_page(self.taille, font_analysis,
+                                      "Analyse IA", (100, 200, 255), 40,
+                                      self.analysis_text, (200, 230, 255), 80, 35)
         
     def should_close(self):
         return time.time() - self.creation_time > self.display_duration
         
     def draw(self, screen, width, height, alpha, font_analysis):
+        if self.contenu is None:
+            self.mettre_en_page(font_analysis)
+
         # Fond semi-transparent bleu foncé
-        overlay = pygame.Surface((width, height), pygame.SRCALPHA)
-        overlay.fill((0, 20, 40, int(128 * alpha)))
-        screen.blit(overlay, (0, 0))
+        dessiner_voile(screen, (0, 0), (width, height), (0, 20, 40), int(128 * alpha))
         
         # Fenêtre d'analyse
-        modal_w, modal_h = 700, 250
+        modal_w, modal_h = self.taille
         modal_x = (width - modal_w) // 2
         modal_y = (height - modal_h) // 2
         
         # Fond de la modale avec effet futuriste
-        modal = pygame.Surface((modal_w, modal_h), pygame.SRCALPHA)
-        pygame.draw.rect(modal, (20, 40, 80, int(230 * alpha)), 
-                        (0, 0, modal_w, modal_h), border_radius=10)
+        dessiner_voile(screen, (modal_x, modal_y), (modal_w, modal_h), (20, 40, 80),
+                       int(230 * alpha), rayon=10)
         
         # Bordure lumineuse
-        pygame.draw.rect(modal, (60, 130, 240, int(150 * alpha)), 
-                        (0, 0, modal_w, modal_h), border_radius=10, width=2)
-        
-        # Titre
-        title = font_analysis.render("Analyse IA", True, (100, 200, 255))
-        title_rect = title.get_rect(center=(modal_w//2, 40))
-        modal.blit(title, title_rect)
-        
-        # Texte d'analyse
-        words = self.analysis_text.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            current_line.append(word)
-            test_line = ' '.join(current_line)
-            if font_analysis.size(test_line)[0] > modal_w - 60:
-                current_line.pop()
-                lines.append(' '.join(current_line))
-                current_line = [word]
-        lines.append(' '.join(current_line))
-        
-        y = 80
-        for line in lines:
-            text = font_analysis.render(line, True, (200, 230, 255))
-            text_rect = text.get_rect(center=(modal_w//2, y))
-            modal.blit(text, text_rect)
-            y += 35
-        
-        screen.blit(modal, (modal_x, modal_y))
+        dessiner_voile(screen, (modal_x, modal_y), (modal_w, modal_h), (60, 130, 240),
+                       int(150 * alpha), rayon=10, epaisseur=2)
+        screen.blit(self.contenu, (modal_x, modal_y))
 
 
 if __name__ == "__main__":
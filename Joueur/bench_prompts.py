@@ -0,0 +1,63 @@
+"""Benchmark: temps de prefill Ollama en fonction de la taille du tableau.
+
+Usage:
+    python bench_prompts.py            # mesure réelle sur le serveur Ollama
+    python bench_prompts.py --hors-ligne   # tailles de prompt seulement
+
+Pour chaque configuration (joueurs x rounds), construit le prompt de vote
+avec prompts.construire_prompt et, en mode réel, l'envoie avec
+num_predict=1 pour ne mesurer que le traitement du prompt
+(prompt_eval_count / prompt_eval_duration renvoyés par Ollama).
+"""
+import random
+import sys
+import time
+
+import requests
+
+import prompts
+from joueur import OLLAMA_URL, OLLAMA_MODEL
+
+CONFIGS = [(2, 5), (5, 5), (10, 5), (10, 20), (10, 50), (10, 200)]
+
+
+def historique_aleatoire(nb_joueurs, nb_rounds, graine=0):
+    rng = random.Random(graine)
+    return {
+        f"j{i}": [round(rng.uniform(5, 25), 1) for _ in range(nb_rounds)]
+        for i in range(nb_joueurs)
+    }
+
+
+def main():
+    hors_ligne = "--hors-ligne" in sys.argv
+    session = requests.Session()
+    entete = "Tu es un detective. Temperatures par capteur (lignes) et par round (colonnes):"
+    consigne = "Reponds uniquement en JSON avec le champ 'espion_presume'."
+
+    print(f"{'joueurs':>7} {'rounds':>6} {'chars':>6} {'tok_est':>7} {'tok_reel':>8} {'prefill_ms':>10} {'total_ms':>8}")
+    for nb_joueurs, nb_rounds in CONFIGS:
+        historique = historique_aleatoire(nb_joueurs, nb_rounds)
+        prompt, options = prompts.construire_prompt(entete, historique, consigne, OLLAMA_MODEL)
+        tok_est = prompts.estimer_tokens(prompt)
+        tok_reel, prefill_ms, total_ms = "-", "-", "-"
+
+        if not hors_ligne:
+            options = dict(options, num_predict=1)
+            t0 = time.time()
+            try:
+                r = session.post(OLLAMA_URL, json={
+                    "model": OLLAMA_MODEL, "prompt": prompt, "stream": False, "options": options
+                }, timeout=120)
+                total_ms = f"{(time.time() - t0) * 1000:.0f}"
+                data = r.json()
+                tok_reel = data.get("prompt_eval_count", "-")
+                prefill_ms = f"{data.get('prompt_eval_duration', 0) / 1e6:.0f}"
+            except Exception as e:
+                print(f"[ERREUR] {e}")
+
+        print(f"{nb_joueurs:>7} {nb_rounds:>6} {len(prompt):>6} {tok_est:>7} {tok_reel:>8} {prefill_ms:>10} {total_ms:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Mode sans interface: plusieurs capteurs (bots) dans un même processus.
+
+Les bots partagent une session HTTP, le service météo, le client Ollama, la
+précision des modèles et le pool de tâches (RessourcesPartagees). Ils
+peuvent aussi partager une seule connexion MQTT (MultiplexeurMQTT): chaque
+bot reçoit un CanalBot qui imite l'interface du client paho utilisée par
+Capteur, et le multiplexeur distribue les messages reçus: iot/role/<id> et
+iot/ville/<id> au seul bot concerné, les autres sujets à tous les bots.
+
+Ce module n'importe ni pygame ni ui, ni requests (session différée).
+"""
+from __future__ import annotations
+import threading
+from typing import Callable, Dict
+
+import ensemble
+import meteo
+from ollama_client import ClientOllama, SessionDifferee
+from taches import PoolTaches
+
+# Sujets propres à un capteur: iot/<sujet>/<id>
+SUJETS_PAR_CAPTEUR = ("iot/role/", "iot/ville/")
+ABONNEMENTS = ["iot/role/+", "iot/ville/+", "iot/demande_vote", "iot/defense",
+               "iot/temperature/#", "iot/resultats", "iot/partie"]
+
+
+class RessourcesPartagees:
+    """Ressources coûteuses d'un capteur, partageables entre plusieurs bots."""
+
+    def __init__(self, ollama_hote: str, fichier_precision: str = None,
+                 nb_travailleurs: int = 4, log: Callable[[str], None] = print):
+        self.session = SessionDifferee()  # requests importé au premier appel HTTP
+        self.meteo = meteo.ServiceMeteo(self.session, log=log)
+        self.ollama = ClientOllama(ollama_hote, self.session, log=log)
+        self.precision = ensemble.PrecisionModeles(fichier_precision)
+        self.taches = PoolTaches(nb_travailleurs, log=log)
+
+
+class CanalBot:
+    """Vue d'un bot sur la connexion partagée (sous-ensemble de mqtt.Client)."""
+
+    def __init__(self, multiplexeur: "MultiplexeurMQTT", capteur_id: str):
+        self.multiplexeur = multiplexeur
+        self.capteur_id = capteur_id
+        self.on_connect = None
+        self.on_message = None
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        return self.multiplexeur.client.publish(topic, payload, qos=qos, retain=retain)
+
+    def subscribe(self, topic, qos=0):
+        # Le multiplexeur est déjà abonné à tous les sujets du jeu
+        return None
+
+    def connect(self, *args, **kwargs):
+        self.multiplexeur.enregistrer(self)
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        self.multiplexeur.retirer(self)
+
+
+class MultiplexeurMQTT:
+    """Une connexion MQTT pour tous les bots du processus."""
+
+    def __init__(self, broker_ip: str, port: int = 1883, log: Callable[[str], None] = print):
+        self.broker_ip = broker_ip
+        self.port = port
+        self.log = log
+        self.canaux: Dict[str, CanalBot] = {}
+        self.connecte = False
+        self._verrou = threading.Lock()
+        import paho.mqtt.client as mqtt  # chargé seulement si le multiplexage est demandé
+        self.client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                                  client_id=f"bots_{id(self):x}")
+        self.client.on_connect = self._quand_connecte
+        self.client.on_message = self._quand_message
+
+    def canal(self, capteur_id: str) -> CanalBot:
+        return CanalBot(self, capteur_id)
+
+    def demarrer(self):
+        self.client.connect(self.broker_ip, self.port, 60)
+        self.client.loop_start()
+
+    def arreter(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    def enregistrer(self, canal: CanalBot):
+        """Ajoute un bot; s'il arrive après la connexion, il reçoit son on_connect tout de suite."""
+        with self._verrou:
+            self.canaux[canal.capteur_id] = canal
+            connecte = self.connecte
+        if connecte and canal.on_connect:
+            canal.on_connect(canal, None, None, 0, None)
+
+    def retirer(self, canal: CanalBot):
+        with self._verrou:
+            self.canaux.pop(canal.capteur_id, None)
+
+    def _quand_connecte(self, client, userdata, flags, rc, properties):
+        if rc != 0:
+            self.log(f"[BOTS] Connexion echouee: code {rc}")
+            return
+        for sujet in ABONNEMENTS:
+            client.subscribe(sujet)
+        with self._verrou:
+            self.connecte = True
+            canaux = list(self.canaux.values())
+        self.log(f"[BOTS] Connexion partagee etablie pour {len(canaux)} bots")
+        for canal in canaux:
+            if canal.on_connect:
+                canal.on_connect(canal, userdata, flags, rc, properties)
+
+    def _quand_message(self, client, userdata, msg):
+        with self._verrou:
+            if msg.topic.startswith(SUJETS_PAR_CAPTEUR):
+                canal = self.canaux.get(msg.topic.rsplit("/", 1)[-1])
+                destinataires = [canal] if canal else []
+            else:
+                destinataires = list(self.canaux.values())
+        for canal in destinataires:
+            if canal.on_message:
+                try:
+                    canal.on_message(canal, userdata, msg)
+                except Exception as e:
+                    self.log(f"[BOTS] {canal.capteur_id}: erreur sur {msg.topic}: {e}")
@@ -0,0 +1,122 @@
+"""Détecteur statistique d'espion, sans LLM.
+
+L'espion décale chacune de ses mesures de random.uniform(-5, 5) degrés.
+Chaque joueur est noté à partir de la matrice joueurs x rounds:
+
+- écart à une référence indépendante pour la ville assignée (relevé
+  externe si fourni, sinon médiane des autres joueurs ayant eu la même
+  ville pendant la partie);
+- z-score robuste (médiane / MAD) dans chaque round;
+- incohérence d'un round à l'autre (dispersion de ses écarts).
+
+Le calcul tient en quelques passes sur des listes plates (numpy n'est pas
+une dépendance du projet): de l'ordre de 0,1 ms pour 10 joueurs x 5
+rounds, sans aucun appel réseau.
+"""
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Poids des trois composantes du score
+POIDS_REFERENCE = 1.0
+POIDS_ZSCORE = 0.5
+POIDS_INCOHERENCE = 0.5
+
+# Échelle minimale (°C) pour ne pas diviser par une dispersion quasi nulle
+ECHELLE_MIN = 0.5
+MAD_VERS_SIGMA = 1.4826
+
+
+def _mediane(valeurs: List[float]) -> float:
+    v = sorted(valeurs)
+    n = len(v)
+    milieu = n // 2
+    return v[milieu] if n % 2 else (v[milieu - 1] + v[milieu]) / 2
+
+
+def _echelle(valeurs: List[float], centre: float) -> float:
+    mad = _mediane([abs(x - centre) for x in valeurs]) if valeurs else 0.0
+    return max(MAD_VERS_SIGMA * mad, ECHELLE_MIN)
+
+
+def _ecart_type(valeurs: List[float]) -> float:
+    if len(valeurs) < 2:
+        return 0.0
+    moyenne = sum(valeurs) / len(valeurs)
+    return (sum((x - moyenne) ** 2 for x in valeurs) / (len(valeurs) - 1)) ** 0.5
+
+
+def classer_suspects(lectures: Dict[str, List[Optional[float]]],
+                     villes: Optional[Dict[str, List[Optional[str]]]] = None,
+                     references: Optional[Dict[str, float]] = None,
+                     exclure: Iterable[str] = ()) -> List[Tuple[str, float]]:
+    """Retourne [(capteur_id, score), ...] du plus au moins suspect.
+
+    lectures: {capteur_id: [temp_round1, temp_round2, ...]} (None si absent)
+    villes: {capteur_id: [ville_round1, ...]}, parallèle à lectures
+    references: {ville: temperature} relevées indépendamment
+    exclure: identifiants à ne pas classer (ex: soi-même); ils servent
+    quand même de point de comparaison.
+    """
+    villes = villes or {}
+    references = references or {}
+    ids = list(lectures)
+
+    # Mesures à plat: (joueur, round, valeur, ville)
+    points = []
+    for cid in ids:
+        temps = lectures[cid]
+        villes_cid = villes.get(cid, [])
+        for r in range(len(temps)):
+            if temps[r] is None:
+                continue
+            ville = villes_cid[r] if r < len(villes_cid) else None
+            points.append((cid, r, float(temps[r]), ville))
+
+    # Z-scores robustes par round
+    par_round: Dict[int, List[float]] = {}
+    for _, r, t, _ in points:
+        par_round.setdefault(r, []).append(t)
+    centres = {r: _mediane(v) for r, v in par_round.items()}
+    echelles = {r: _echelle(v, centres[r]) for r, v in par_round.items()}
+
+    # Mesures par ville pour la référence de consensus
+    par_ville: Dict[str, List[Tuple[str, float]]] = {}
+    for cid, _, t, ville in points:
+        if ville:
+            par_ville.setdefault(ville, []).append((cid, t))
+
+    zscores: Dict[str, List[float]] = {cid: [] for cid in ids}
+    ecarts_ref: Dict[str, List[float]] = {cid: [] for cid in ids}
+    for cid, r, t, ville in points:
+        if len(par_round[r]) >= 3:
+            zscores[cid].append(abs(t - centres[r]) / echelles[r])
+        ref = references.get(ville) if ville else None
+        if ref is None and ville:
+            autres = [x for autre, x in par_ville[ville] if autre != cid]
+            ref = _mediane(autres) if autres else None
+        if ref is not None:
+            ecarts_ref[cid].append(t - ref)
+
+    tous_ecarts = [abs(e) for v in ecarts_ref.values() for e in v]
+    echelle_ref = _echelle(tous_ecarts, 0.0) if tous_ecarts else ECHELLE_MIN
+
+    exclus = set(exclure)
+    classement = []
+    for cid in ids:
+        if cid in exclus:
+            continue
+        score = 0.0
+        if ecarts_ref[cid]:
+            score += POIDS_REFERENCE * sum(abs(e) for e in ecarts_ref[cid]) / len(ecarts_ref[cid]) / echelle_ref
+            score += POIDS_INCOHERENCE * _ecart_type(ecarts_ref[cid]) / echelle_ref
+        if zscores[cid]:
+            score += POIDS_ZSCORE * sum(zscores[cid]) / len(zscores[cid])
+        classement.append((cid, round(score, 3)))
+
+    classement.sort(key=lambda x: x[1], reverse=True)
+    return classement
+
+
+def resume_classement(classement: List[Tuple[str, float]], nb: int = 5) -> str:
+    """Texte court du classement, utilisé comme indice dans les prompts."""
+    return ", ".join(f"{cid}={score:.2f}" for cid, score in classement[:nb])
@@ -0,0 +1,113 @@
+"""Vote d'ensemble: plusieurs modèles interrogés en parallèle.
+
+Chaque votant (modèle Ollama ou détecteur local) est lancé dans son
+propre thread. Les réponses sont cumulées avec un poids par votant et le
+vote est rendu dès qu'un suspect dépasse le quorum: la latence devient
+celle de l'accord le plus rapide, et non celle du modèle le plus lent.
+Les votants encore en cours continuent: leur réponse tardive est ajoutée
+aux votes retournés, pour que la précision de chacun soit mesurée.
+
+Les poids viennent de la précision observée de chaque votant sur les
+parties précédentes (PrecisionModeles).
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as DelaiEcoule
+from typing import Callable, Dict, Optional, Tuple
+
+
+class PrecisionModeles:
+    """Compte les votes justes de chaque votant, en mémoire et dans un fichier optionnel."""
+
+    def __init__(self, fichier: Optional[str] = None):
+        self.fichier = fichier
+        self.scores: Dict[str, Dict[str, int]] = {}
+        self._verrou = threading.Lock()
+        if fichier and os.path.exists(fichier):
+            try:
+                with open(fichier, encoding="utf-8") as f:
+                    self.scores = json.load(f)
+            except (OSError, ValueError):
+                self.scores = {}
+
+    def poids(self, nom: str) -> float:
+        """Précision lissée (règle de Laplace): 0.5 pour un votant jamais évalué."""
+        s = self.scores.get(nom, {})
+        return (s.get("justes", 0) + 1) / (s.get("total", 0) + 2)
+
+    def enregistrer(self, votes: Dict[str, str], espion: str) -> None:
+        """Met à jour les scores avec les votes {votant: suspect} d'une partie terminée."""
+        with self._verrou:
+            # Copie: des votes tardifs peuvent encore arriver (voter_ensemble)
+            for nom, suspect in list(votes.items()):
+                s = self.scores.setdefault(nom, {"justes": 0, "total": 0})
+                s["total"] += 1
+                s["justes"] += int(suspect == espion)
+            if self.fichier:
+                try:
+                    with open(self.fichier, "w", encoding="utf-8") as f:
+                        json.dump(self.scores, f, indent=2)
+                except OSError:
+                    pass
+
+
+def voter_ensemble(votants: Dict[str, Callable[[], Optional[str]]], poids: Dict[str, float],
+                   quorum: float = 0.5, echeance: Optional[float] = None,
+                   log: Callable[[str], None] = print) -> Tuple[Optional[str], Dict[str, str]]:
+    """Interroge les votants en parallèle et retourne (suspect, votes reçus).
+
+    Le suspect est rendu dès que son poids cumulé dépasse quorum x poids
+    total. Sinon, à l'échéance ou quand tous ont répondu, le suspect au
+    poids le plus élevé l'emporte. Les votants qui n'ont pas encore répondu
+    ne comptent pas pour ce suspect, mais leur réponse est ajoutée plus
+    tard au dictionnaire de votes retourné (pour PrecisionModeles).
+    """
+    total = sum(poids.get(nom, 1.0) for nom in votants)
+    cumul: Dict[str, float] = {}
+    votes: Dict[str, str] = {}
+
+    def vote_tardif(futur):
+        nom = futurs[futur]
+        try:
+            suspect = futur.result()
+        except Exception as e:
+            log(f"[ENSEMBLE] {nom} en echec (tardif): {e}")
+            return
+        if suspect:
+            votes[nom] = suspect
+            log(f"[ENSEMBLE] Vote tardif de {nom}: {suspect}")
+
+    executeur = ThreadPoolExecutor(max_workers=max(1, len(votants)))
+    futurs = {executeur.submit(fn): nom for nom, fn in votants.items()}
+    traites = set()
+    try:
+        restant = None if echeance is None else max(0.0, echeance - time.time())
+        for futur in as_completed(futurs, timeout=restant):
+            traites.add(futur)
+            nom = futurs[futur]
+            try:
+                suspect = futur.result()
+            except Exception as e:
+                log(f"[ENSEMBLE] {nom} en echec: {e}")
+                continue
+            if not suspect:
+                continue
+            votes[nom] = suspect
+            cumul[suspect] = cumul.get(suspect, 0.0) + poids.get(nom, 1.0)
+            if cumul[suspect] > quorum * total:
+                log(f"[ENSEMBLE] Quorum atteint pour {suspect}: {votes}")
+                return suspect, votes
+    except DelaiEcoule:
+        log(f"[ENSEMBLE] Echeance atteinte, votes recus: {votes}")
+    finally:
+        for futur in futurs:
+            if futur not in traites:
+                futur.add_done_callback(vote_tardif)
+        executeur.shutdown(wait=False)
+
+    if not cumul:
+        return None, votes
+    return max(cumul, key=cumul.get), votes
@@ -0,0 +1,107 @@
+"""Index persistant des coordonnées de villes.
+
+Les villes du jeu sont connues d'avance: leurs coordonnées sont livrées
+dans VILLES_CONNUES et complétées par un fichier JSON local qui conserve
+chaque ville géocodée en ligne. Le fichier est lu une seule fois, au premier
+besoin, et réécrit seulement quand une nouvelle ville y est ajoutée. Un
+redémarrage du joueur ne refait donc aucune requête de géocodage, et un
+round ne dépend plus du service de géocodage pour les villes du jeu.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+URL_GEOCODAGE = "https://geocoding-api.open-meteo.com/v1/search"
+FICHIER_GEOCODAGE = "geocodage.json"
+DELAI_HTTP = 5
+
+# Villes possibles de l'arbitre (ServeurArbitre.pool_villes)
+VILLES_CONNUES: Dict[str, Tuple[float, float]] = {
+    "Chambery": (45.5646, 5.9178),
+    "Vassieux-en-Vercors": (44.8950, 5.3717),
+    "Annecy": (45.8992, 6.1294),
+    "Genève": (46.2044, 6.1432),
+    "Lyon": (45.7485, 4.8467),
+    "Grenoble": (45.1667, 5.7167),
+    "Albertville": (45.6755, 6.3925),
+    "Aix-les-Bains": (45.6886, 5.9153),
+    "Valence": (44.9333, 4.8917),
+    "Saint-Étienne": (45.4339, 4.3900),
+}
+
+
+class IndexGeocodage:
+    """Coordonnées par ville: table livrée, fichier local, puis géocodage en ligne."""
+
+    def __init__(self, session=None, fichier: Optional[str] = FICHIER_GEOCODAGE,
+                 log: Callable[[str], None] = print):
+        self.session = session
+        self.fichier = fichier
+        self.log = log
+        self._index: Optional[Dict[str, Tuple[float, float]]] = None
+        self._verrou = threading.Lock()
+
+    def _charger(self) -> Dict[str, Tuple[float, float]]:
+        if self._index is None:
+            index = dict(VILLES_CONNUES)
+            if self.fichier and os.path.exists(self.fichier):
+                try:
+                    with open(self.fichier, encoding="utf-8") as f:
+                        index.update({v: tuple(c) for v, c in json.load(f).items()})
+                except (OSError, ValueError, TypeError) as e:
+                    self.log(f"[GEO] Index illisible ({e}), table livree seule")
+            self._index = index
+        return self._index
+
+    def _sauver(self) -> None:
+        if not self.fichier:
+            return
+        ajoutees = {v: c for v, c in self._index.items() if VILLES_CONNUES.get(v) != c}
+        try:
+            with open(self.fichier, "w", encoding="utf-8") as f:
+                json.dump(ajoutees, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            self.log(f"[GEO] Sauvegarde de l'index impossible: {e}")
+
+    def _geocoder(self, ville: str) -> Tuple[float, float]:
+        if self.session is None:
+            raise ValueError(f"ville inconnue hors ligne: {ville}")
+        r = self.session.get(URL_GEOCODAGE, params={"name": ville, "count": 1}, timeout=DELAI_HTTP)
+        r.raise_for_status()
+        geo = r.json().get("results")
+        if not geo:
+            raise ValueError(f"no geocode results for {ville}")
+        return geo[0]["latitude"], geo[0]["longitude"]
+
+    def coordonnees(self, ville: str) -> Tuple[float, float]:
+        """Latitude et longitude d'une ville; ValueError si introuvable."""
+        coords = self.resoudre([ville])
+        if ville not in coords:
+            raise ValueError(f"no geocode results for {ville}")
+        return coords[ville]
+
+    def resoudre(self, villes: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        """Résout un lot de villes; les inconnues sont géocodées puis enregistrées.
+
+        Les villes introuvables sont absentes du résultat.
+        """
+        with self._verrou:
+            index = self._charger()
+            resultat, inconnues = {}, []
+            for ville in dict.fromkeys(villes):
+                if ville in index:
+                    resultat[ville] = index[ville]
+                else:
+                    inconnues.append(ville)
+            ajout = False
+            for ville in inconnues:
+                try:
+                    index[ville] = resultat[ville] = self._geocoder(ville)
+                    ajout = True
+                except Exception as e:
+                    self.log(f"[GEO] Geocodage impossible pour {ville}: {e}")
+            if ajout:
+                self._sauver()
+        return resultat
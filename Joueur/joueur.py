@@ -1,42 +1,103 @@
-import paho.mqtt.client as mqtt
-from paho.mqtt.client import CallbackAPIVersion
-import requests
 import sys
 import json
 import random
 import threading
-import pygame
-from pygame.locals import *
+import time
+from log_utils import Chrono, group
+
+# Démarrage: pygame et ui ne sont chargés qu'une fois la connexion MQTT
+# lancée, paho à la création du client (--temps-demarrage pour le détail)
+CHRONO_DEMARRAGE = Chrono()
+
+with CHRONO_DEMARRAGE.etape("import modules du jeu"):
+    import prompts
+    import schemas
+    import detecteur
+    import ensemble
+    import meteo
+    from bots import MultiplexeurMQTT, RessourcesPartagees
+    from releves import MagasinReleves
+    from ollama_client import SessionChat, ReponseInvalide
 
 BROKER_IP = "10.109.150.194"
 BROKER_PORT = 1883
-OLLAMA_URL = "http://10.103.1.12:11434/api/generate"
+OLLAMA_HOTE = "http://10.103.1.12:11434"
+OLLAMA_URL = f"{OLLAMA_HOTE}/api/generate"
 OLLAMA_MODEL = "gemma3:4b"
 OLLAMA_MODEL_ESPION = "gpt-oss:20b"
 NB_ROUNDS = 5
+# Conversation persistante par joueur (/api/chat) au lieu d'un prompt complet par vote
+OLLAMA_MODE_SESSION = False
+# "llm": vote par Ollama (détecteur en secours), "detecteur": vote local uniquement,
+# "ensemble": plusieurs modèles en parallèle, premier quorum retenu
+MODE_VOTE = "llm"
+# Votants du mode ensemble ("detecteur" désigne le détecteur statistique local)
+MODELES_ENSEMBLE = ["gemma3:4b", "gpt-oss:20b", "detecteur"]
+# Part du poids total qu'un suspect doit dépasser pour clore le vote d'ensemble
+QUORUM_ENSEMBLE = 0.5
+# Précision de chaque votant, conservée d'une partie à l'autre
+FICHIER_PRECISION = "precision_modeles.json"
+# Ajoute le classement du détecteur statistique comme indice dans les prompts de vote
+INDICE_DETECTEUR = True
+# Temps gardé avant l'échéance de vote pour publier le vote (secondes)
+MARGE_VOTE = 1.0
+# Écart toléré entre l'échéance du serveur et notre horloge avant de l'ignorer
+TOLERANCE_HORLOGE = 2.0
+# Vote LLM préparé en arrière-plan à chaque round complet (mode "llm" sans session):
+# à la demande de vote, la réponse est déjà prête si aucun relevé n'a changé depuis
+PRE_VOTE = False
+# Analyse de la défense lancée dès sa réception, bornée à ce délai (fenêtre du vote round 2)
+DELAI_ANALYSE_DEFENSE = 15.0
+# Boucle d'affichage: sans changement d'état, redessin au plus tous les DELAI_VEILLE_UI ms
+DELAI_VEILLE_UI = 1000
+FPS_UI = 30
+# Temps accordé au relevé météo d'un round avant de servir la dernière valeur connue
+DELAI_RELEVE = 4.0
+# Durée maximale d'un préchauffage de session: il ne doit pas retarder un vote
+DELAI_PRECHAUFFAGE = 5.0
+# Bots (--bots): travailleurs du pool partagé par bot hors mode détecteur; le
+# vote et l'analyse de défense (ou le pré-vote) bloquent chacun un travailleur
+# pendant un appel LLM, un pool fixe ferait attendre les votes au-delà de la fenêtre
+TRAVAILLEURS_PAR_BOT = 2
+TRAVAILLEURS_MIN = 8
 
 class Capteur:
-    def __init__(self, capteur_id, broker_ip=BROKER_IP):
+    def __init__(self, capteur_id, broker_ip=BROKER_IP, mode_session=OLLAMA_MODE_SESSION, mode_vote=MODE_VOTE,
+                 ressources=None, client=None, pre_vote=PRE_VOTE):
+        """ressources: RessourcesPartagees entre bots (propres au capteur si None)
+        client: client MQTT, ou CanalBot d'un MultiplexeurMQTT (connexion propre si None)
+        """
         self.id = capteur_id
         self.broker_ip = broker_ip
         self.role = None
         self.ville = None
         
-        self.temperatures = {}
-        self.mes_temperatures = []
+        # Relevés de tous les capteurs (moi compris), rangés par round
+        self.releves = MagasinReleves(NB_ROUNDS)
+        # Températures de référence {ville: temp} relevées indépendamment (détecteur)
+        self.references_meteo = {}
         self.round_count = 0
         self.vote_envoye = False
         self.defense_recue = None
         self.vote_round = 1  # 1 = premier vote, 2 = second vote
         
-        self.client = mqtt.Client(
-            callback_api_version=CallbackAPIVersion.VERSION2,
-            client_id=f"capteur_{self.id}"
-        )
+        if client is None:
+            with CHRONO_DEMARRAGE.etape("import paho"):
+                import paho.mqtt.client as mqtt
+            client = mqtt.Client(
+                callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                client_id=f"capteur_{self.id}"
+            )
+        self.client = client
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
 
-        # Pygame
+        # Pygame (module ui lié une seule fois au démarrage de l'affichage)
+        self.ui = None
+        self.rapport_demarrage = False
+        # Incrémenté à chaque changement d'état affiché; la boucle ne redessine que s'il bouge
+        self.version_etat = 0
+        self._reveiller_ui = None
         self.screen = None
         self.font_big = None
         self.font_medium = None
@@ -50,41 +111,83 @@ class Capteur:
         self.avatar_images = [None] * len(self.avatar_filenames)
         self.scaled_avatars = {}
         self.stars = [(random.randint(0, 1200), random.randint(0, 800)) for _ in range(50)]
+        self.fonds = {}  # fonds étoilés pré-rendus par couleur de rôle (ui.fond_etoile)
         
-        self.session = requests.Session()
-        self._geocode_cache = {}
+        ressources = ressources or RessourcesPartagees(OLLAMA_HOTE, FICHIER_PRECISION, log=self.log)
+        self.session = ressources.session
+        self.meteo = ressources.meteo
+        # Traitements déclenchés par les messages MQTT (un seul par type et par capteur à la fois)
+        self.taches = ressources.taches
+
+        # Ollama
+        self.ollama = ressources.ollama
+        self.mode_session = mode_session
+        self.session_ia = None
+        self._verrou_session = threading.Lock()
+        self.defense_analyse = None
+        self.mode_vote = mode_vote
+        self.precision = ressources.precision
+        self.votes_ensemble = []  # votes par votant pour chaque tour de la partie
+
+        # Analyse incrémentale: classement du détecteur tenu à jour à chaque relevé,
+        # et vote LLM anticipé (version des relevés, suspect, événement de fin)
+        self.pre_vote = pre_vote
+        # Analyse de la défense en cours: (défense analysée, événement de fin)
+        self.analyse_en_cours = None
+        self._classement = (None, [])
+        self.prevote = None
+        self._rounds_analyses = 0
 
     def log(self, msg):
         print(f"[{self.id}] {msg}")
 
-    def get_meteo(self, ville):
+    def marquer_modifie(self):
+        """Signale un changement d'état à l'affichage (appelable depuis n'importe quel thread)"""
+        self.version_etat += 1
+        if self._reveiller_ui:
+            try:
+                self._reveiller_ui()
+            except Exception:
+                pass  # file d'événements pleine ou pygame arrêté: rattrapé par DELAI_VEILLE_UI
+
+    def planifier(self, type_tache, fn, *args, **kwargs):
+        """Soumet une tâche au pool; le type est propre à ce capteur (pool partagé entre bots)"""
+        return self.taches.soumettre(f"{self.id}:{type_tache}", fn, *args, **kwargs)
+
+    @property
+    def temperatures(self):
+        """{capteur_id: [temp_round1, ...]} des autres capteurs (None si round manquant)"""
+        return self.releves.series(exclure=[self.id])
+
+    @property
+    def mes_temperatures(self):
+        return self.releves.serie(self.id)
+
+    @property
+    def villes_capteurs(self):
+        return self.releves.series_villes(exclure=[self.id])
+
+    @property
+    def mes_villes(self):
+        return self.releves.villes(self.id)
+
+    def precharger_meteo(self, villes):
+        """Précharge la météo des villes de la partie et en fait les références du détecteur
+
+        Pas de références avec une sonde locale: comparer les autres à notre
+        propre mesure accuserait tout capteur honnête dont la sonde diffère.
+        """
+        if not self.meteo.fournisseur.reference:
+            self.references_meteo.clear()
+            return
         try:
-            if ville in self._geocode_cache:
-                lat, lon = self._geocode_cache[ville]
-            else:
-                r = self.session.get(
-                    "https://geocoding-api.open-meteo.com/v1/search",
-                    params={"name": ville, "count": 1},
-                    timeout=5
-                )
-                r.raise_for_status()
-                geo = r.json().get("results")
-                if not geo:
-                    raise ValueError("no geocode results")
-                geo0 = geo[0]
-                lat, lon = geo0["latitude"], geo0["longitude"]
-                self._geocode_cache[ville] = (lat, lon)
-
-            r = self.session.get(
-                "https://api.open-meteo.com/v1/forecast",
-                params={"latitude": lat, "longitude": lon, "current_weather": "true"},
-                timeout=5
-            )
-            r.raise_for_status()
-            temp = r.json().get("current_weather", {}).get("temperature")
+            self.references_meteo.update(self.meteo.precharger(villes))
+        except Exception as e:
+            self.log(f"[ERREUR] Prechargement meteo: {e}")
 
-            if temp is None:
-                raise ValueError("no temperature in response")
+    def get_meteo(self, ville):
+        try:
+            temp = self.meteo.temperature(ville, echeance=time.time() + DELAI_RELEVE)
 
             if self.role == "espion":
                 temp += random.uniform(-5, 5)
@@ -95,177 +198,301 @@ class Capteur:
             self.log(f"[ERREUR] API meteo: {e}")
             return None
 
-    def analyser_defense_ollama(self):
+    def analyser_defense_ollama(self, echeance=None):
         """Analyse la crédibilité de la défense reçue"""
         try:
             if not self.defense_recue:
                 return None
 
-            prompt = f"Tu es un detective expert en analyse comportementale. Analyse la defense d'un capteur accusé d'être un espion.\n\n"
-            prompt += f"Voici les températures du capteur accusé ({self.defense_recue['capteur_id']}):\n"
-            if self.defense_recue['capteur_id'] in self.temperatures:
-                for i, t in enumerate(self.temperatures[self.defense_recue['capteur_id']]):
-                    prompt += f"Round {i+1}: {t} degres\n"
-
-            prompt += "\nTemperatures des autres capteurs:\n"
-            for cid, temps in sorted(self.temperatures.items()):
-                if cid != self.defense_recue['capteur_id']:
-                    prompt += f"\nCapteur {cid}:\n"
-                    for i, t in enumerate(temps):
-                        prompt += f"Round {i+1}: {t} degres\n"
-            
-            prompt += f"\nLe capteur accusé s'est défendu ainsi:\n"
-            prompt += f'"{self.defense_recue["defense"]}"\n\n'
-            prompt += "Analyse la crédibilité de cette défense. Est-elle sincère ou suspecte? "
-            prompt += "Reponds uniquement en JSON avec les champs 'credible' (boolean) et 'analyse' (string). Ne fournis aucun texte hors du JSON."
-
-            response = self.session.post(
-                OLLAMA_URL,
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "format": "json",
-                    "stream": False
-                },
-                timeout=60
-            )
+            entete = "Tu es un detective expert en analyse comportementale. Analyse la defense d'un capteur accusé d'être un espion.\n"
+            entete += f"Capteur accusé: {self.defense_recue['capteur_id']}. Températures par capteur (lignes) et par round (colonnes):"
+            defense = f'Le capteur accusé s\'est défendu ainsi:\n"{self.defense_recue["defense"]}"'
+            consigne = "Analyse la crédibilité de cette défense. Est-elle sincère ou suspecte? "
+            consigne += "Reponds uniquement en JSON avec les champs 'credible' (boolean) et 'analyse' (string). Ne fournis aucun texte hors du JSON."
+            prompt, options = prompts.construire_prompt(entete, self.temperatures, consigne, OLLAMA_MODEL, defense)
+
+            analyse = self.ollama.generer_json(OLLAMA_MODEL, prompt, schemas.ANALYSE, options=options,
+                                               timeout=60, echeance=echeance)
+            self.log(f"[OLLAMA] Analyse défense: {analyse}")
+            return analyse
 
-            if response.status_code == 200:
-                result = response.json()
-                reponse_ia = result.get("response", "").strip()
-                self.log(f"[OLLAMA] Analyse défense: {reponse_ia}")
-                
-                try:
-                    parsed = json.loads(reponse_ia)
-                    return parsed
-                except json.JSONDecodeError:
-                    self.log("[OLLAMA] Erreur de parsing JSON analyse")
-                    return None
-                    
-            return None
-                
         except Exception as e:
             self.log(f"[ERREUR] Ollama analyse défense: {e}")
             return None
 
-    def demander_vote_ollama(self, avec_defense=False):
-        """Demande à Ollama qui voter"""
+    def lancer_analyse_defense(self):
+        """Analyse la défense en tâche de fond dès sa réception, pendant l'attente du vote round 2"""
+        if self.mode_vote == "detecteur" or self.session_ia or not self.defense_recue:
+            return  # en session, analyse et vote sont demandés en une seule réponse
+        analyse = (self.defense_recue, threading.Event())
+        if self.planifier("analyse", self._analyser_defense, analyse, remplacer=True):
+            self.analyse_en_cours = analyse
+
+    def _analyser_defense(self, analyse):
+        defense, fini = analyse
         try:
-            # Construire le prompt
-            prompt = f"Tu es un detective qui analyse des temperatures mesurees par des capteurs. Un des capteurs est un espion qui envoie de fausses donnees.\n\n"
-            prompt += f"Mes temperatures (capteur {self.id}):\n"
-            for i, t in enumerate(self.mes_temperatures):
-                prompt += f"Round {i+1}: {t} degres\n"
-            
-            prompt += "\nTemperatures des autres capteurs:\n"
-            for cid, temps in sorted(self.temperatures.items()):
-                prompt += f"\nCapteur {cid}:\n"
-                for i, t in enumerate(temps):
-                    prompt += f"Round {i+1}: {t} degres\n"
-            
-            if avec_defense and self.defense_recue:
-                self.defense_analyse = self.analyser_defense_ollama()
-                prompt += f"\nLe capteur accuse ({self.defense_recue['capteur_id']}) s'est defend ainsi:\n"
-                prompt += f'"{self.defense_recue["defense"]}"\n\n'
-                if self.defense_analyse:
-                    prompt += f"Analyse de la défense: {self.defense_analyse.get('analyse', '')}\n"
-                    prompt += f"La défense semble {'crédible' if self.defense_analyse.get('credible') else 'suspecte'}.\n\n"
-                prompt += "En tenant compte de cette defense et de son analyse, qui penses-tu etre l'espion? "
-            else:
-                prompt += "\nQuel capteur penses-tu etre l'espion? Analyse les ecarts de temperature et "
-            prompt += "Reponds uniquement en JSON avec le champ 'espion_presume' contenant l'ID du capteur suspect (ex: {\"espion_presume\": \"bot\"}). Ne fournis aucun texte hors du JSON."
-            
-            self.log("[OLLAMA] Envoi de la demande de vote")
-            
-            response = self.session.post(
-                OLLAMA_URL,
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "format": "json",
-                    "stream": False
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                reponse_ia = result.get("response", "").strip()
-                self.log(f"[OLLAMA] Reponse IA: {reponse_ia}")
-                
-                # Parser la réponse JSON
-                try:
-                    parsed = json.loads(reponse_ia)
-                    espion_presume = parsed.get("espion_presume")
-                    if espion_presume:
-                        return espion_presume
-                except json.JSONDecodeError:
-                    self.log("[OLLAMA] Erreur de parsing JSON")
-                
-                # Fallback si pas trouvé
-                self.log("[OLLAMA] ID non trouve dans la reponse, vote aleatoire")
-                return random.choice(list(self.temperatures.keys())) if self.temperatures else "aucun"
+            resultat = self.analyser_defense_ollama(time.time() + DELAI_ANALYSE_DEFENSE)
+            if self.defense_recue is defense:
+                self.defense_analyse = resultat
+        finally:
+            fini.set()
+
+    def attendre_analyse_defense(self, echeance=None):
+        """Attend l'analyse lancée à la réception de la défense; False si aucune n'est en cours"""
+        analyse = self.analyse_en_cours
+        if not analyse or analyse[0] is not self.defense_recue:
+            return False
+        attente = None if echeance is None else max(0.0, echeance - time.time())
+        if not analyse[1].wait(attente):
+            self.log("[OLLAMA] Analyse de la defense pas prete a temps, vote sans analyse")
+        return True
+
+    def demander_vote_ollama(self, avec_defense=False, echeance=None):
+        """Demande à Ollama qui voter
+
+        echeance: instant (time.time()) avant lequel le vote doit être publié;
+        les appels au LLM sont coupés pour laisser MARGE_VOTE secondes.
+        """
+        try:
+            limite = echeance - MARGE_VOTE if echeance is not None else None
+            if self.session_ia:
+                parsed = self.demander_vote_session(avec_defense, limite)
             else:
-                self.log(f"[ERREUR] Ollama erreur HTTP: {response.status_code}")
-                return None
-                
+                parsed = self.demander_vote_prompt(avec_defense, limite)
+            self.log(f"[OLLAMA] Reponse IA: {parsed}")
+
+            if avec_defense and "analyse" in parsed:
+                self.defense_analyse = {"credible": parsed.get("credible"), "analyse": parsed.get("analyse")}
+            return parsed["espion_presume"]
+
+        except ReponseInvalide as e:
+            self.log(f"[OLLAMA] {e}")
+            return None
         except Exception as e:
             self.log(f"[ERREUR] Ollama: {e}")
             return None
 
+    def demander_vote_prompt(self, avec_defense, echeance=None, modele=OLLAMA_MODEL, analyser=True):
+        """Vote en une requête /api/generate contenant tout l'historique
+
+        analyser: au round 2, attend l'analyse de la défense lancée à sa
+        réception (ou la demande maintenant si elle n'a pas été lancée). Sans
+        analyser, une analyse déjà disponible est quand même incluse.
+        """
+        entete = "Tu es un detective qui analyse des temperatures mesurees par des capteurs. Un des capteurs est un espion qui envoie de fausses donnees.\n"
+        entete += f"Je suis le capteur {self.id}. Temperatures par capteur (lignes) et par round (colonnes):"
+        historique = dict(self.temperatures)
+        historique[self.id] = self.mes_temperatures
+
+        defense = ""
+        if avec_defense and self.defense_recue:
+            if analyser:
+                # L'analyse ne doit pas consommer plus de la moitié du temps restant
+                echeance_analyse = None
+                if echeance is not None:
+                    echeance_analyse = time.time() + (echeance - time.time()) / 2
+                if not self.attendre_analyse_defense(echeance_analyse):
+                    self.defense_analyse = self.analyser_defense_ollama(echeance_analyse)
+            defense = f"Le capteur accuse ({self.defense_recue['capteur_id']}) s'est defend ainsi:\n"
+            defense += f'"{self.defense_recue["defense"]}"'
+            if self.defense_analyse:
+                defense += f"\nAnalyse de la défense: {self.defense_analyse.get('analyse', '')}\n"
+                defense += f"La défense semble {'crédible' if self.defense_analyse.get('credible') else 'suspecte'}."
+            consigne = "En tenant compte de cette defense et de son analyse, qui penses-tu etre l'espion? "
+        else:
+            consigne = "Quel capteur penses-tu etre l'espion? Analyse les ecarts de temperature et "
+        consigne += "Reponds uniquement en JSON avec le champ 'espion_presume' contenant l'ID du capteur suspect (ex: {\"espion_presume\": \"bot\"}). Ne fournis aucun texte hors du JSON."
+        if INDICE_DETECTEUR:
+            defense = f"{defense}\n\n{self.indice_detecteur()}".strip()
+        prompt, options = prompts.construire_prompt(entete, historique, consigne, modele, defense)
+
+        self.log(f"[OLLAMA] Envoi de la demande de vote ({modele})")
+        return self.ollama.generer_json(modele, prompt, schemas.schema_vote(self.candidats_vote()),
+                                        options=options, timeout=60, echeance=echeance)
+
+    def demander_vote_ensemble(self, avec_defense=False, echeance=None):
+        """Vote d'ensemble: MODELES_ENSEMBLE en parallèle, pondérés par leur précision passée"""
+        limite = echeance - MARGE_VOTE if echeance is not None else None
+        votants = {}
+        for nom in MODELES_ENSEMBLE:
+            if nom == "detecteur":
+                votants[nom] = self.vote_heuristique
+            else:
+                votants[nom] = lambda m=nom: self.demander_vote_prompt(
+                    avec_defense, limite, modele=m, analyser=False)["espion_presume"]
+        poids = {nom: self.precision.poids(nom) for nom in votants}
+        suspect, votes = ensemble.voter_ensemble(votants, poids, QUORUM_ENSEMBLE, limite, self.log)
+        self.votes_ensemble.append(votes)
+        return suspect
+
+    # ===== Session de conversation Ollama =====
+
+    def ouvrir_session_ia(self):
+        """Démarre une conversation neuve pour la partie (mode session uniquement)"""
+        with self._verrou_session:
+            if not self.mode_session:
+                self.session_ia = None
+                return
+            systeme = "Tu es un detective qui analyse des temperatures mesurees par des capteurs. Un des capteurs est un espion qui envoie de fausses donnees.\n"
+            systeme += f"Je suis le capteur {self.id}. Je vais te transmettre les temperatures round par round, "
+            systeme += "puis je te poserai des questions. Reponds toujours uniquement en JSON."
+            self.session_ia = SessionChat(self.ollama, OLLAMA_MODEL, systeme, prompts.budget_modele(OLLAMA_MODEL))
+
+    def alimenter_session_ia(self, final=False):
+        """Ajoute à la conversation les rounds complets pas encore transmis
+
+        final: transmet aussi les rounds incomplets (au moment du vote).
+        """
+        with self._verrou_session:
+            session = self.session_ia
+            if not session:
+                return
+            series = self.temperatures
+            series[f"{self.id}(moi)"] = self.mes_temperatures
+            if final:
+                limite = max(len(t) for t in series.values())
+            else:
+                limite = self.releves.rounds_complets()
+
+            ajoute = False
+            while session.rounds_envoyes < limite:
+                r = session.rounds_envoyes
+                mesures = " ".join(f"{cid}={t[r] if r < len(t) and t[r] is not None else '--'}"
+                                   for cid, t in sorted(series.items()))
+                session.ajouter(f"Round {r + 1}: {mesures}")
+                session.rounds_envoyes += 1
+                ajoute = True
+
+        # Faire traiter les nouveaux messages tout de suite: le vote ne paiera que la question
+        if ajoute and not final:
+            self.planifier("prechauffage", self._prechauffer_session, session)
+
+    def _prechauffer_session(self, session):
+        if self.taches.occupe(f"{self.id}:vote"):
+            return  # le vote enverra lui-même ces messages
+        try:
+            session.prechauffer(echeance=time.time() + DELAI_PRECHAUFFAGE)
+        except Exception as e:
+            self.log(f"[OLLAMA] Prechauffage session echoue: {e}")
+
+    def demander_vote_session(self, avec_defense, echeance=None):
+        """Vote en posant la question dans la conversation persistante
+
+        Au round 2, l'analyse de la défense et le vote sont demandés dans la
+        même réponse au lieu de deux requêtes successives.
+        """
+        self.alimenter_session_ia(final=True)
+        question = f"{self.indice_detecteur()}\n" if INDICE_DETECTEUR else ""
+        if avec_defense and self.defense_recue:
+            question += f"Le capteur accuse ({self.defense_recue['capteur_id']}) s'est defend ainsi:\n"
+            question += f'"{self.defense_recue["defense"]}"\n'
+            question += "Analyse la crédibilité de cette défense puis, en en tenant compte, indique qui est l'espion. "
+            question += "Reponds uniquement en JSON avec les champs 'credible' (boolean), 'analyse' (string) et 'espion_presume' (ID du capteur suspect)."
+        else:
+            question += "Quel capteur penses-tu etre l'espion? Analyse les ecarts de temperature et "
+            question += "Reponds uniquement en JSON avec le champ 'espion_presume' contenant l'ID du capteur suspect (ex: {\"espion_presume\": \"bot\"})."
+
+        schema = schemas.schema_vote(self.candidats_vote(), avec_analyse=avec_defense and self.defense_recue is not None)
+        self.log("[OLLAMA] Envoi de la demande de vote (session)")
+        return self.session_ia.demander_json(question, schema, timeout=60, echeance=echeance)
+
     def generer_defense_ollama(self):
         """Génère une défense via Ollama si accusé"""
         try:
-            prompt = f"Tu es le capteur {self.id} accuse d'etre un espion. Voici tes temperatures:\n"
-            for i, t in enumerate(self.mes_temperatures):
-                prompt += f"Round {i+1}: {t} degres\n"
-            
-            prompt += "\nTemperatures des autres capteurs:\n"
-            for cid, temps in sorted(self.temperatures.items()):
-                prompt += f"\nCapteur {cid}:\n"
-                for i, t in enumerate(temps):
-                    prompt += f"Round {i+1}: {t} degres\n"
-            
-            prompt += f"\nRédige une défense honnête en 2 à 3 phrases expliquant pourquoi {self.id} pourrait ne pas être l'espion.\n"
-            prompt += "Reponds uniquement en JSON avec le champ 'defense' contenant le texte de la defense (ex: {\"defense\": \"Texte de defense\"}). Ne fournis aucun texte hors du JSON."
+            entete = f"Tu es le capteur {self.id} accuse d'etre un espion. Temperatures par capteur (lignes) et par round (colonnes):"
+            historique = dict(self.temperatures)
+            historique[self.id] = self.mes_temperatures
+            consigne = f"Rédige une défense honnête en 2 à 3 phrases expliquant pourquoi {self.id} pourrait ne pas être l'espion.\n"
+            consigne += "Reponds uniquement en JSON avec le champ 'defense' contenant le texte de la defense (ex: {\"defense\": \"Texte de defense\"}). Ne fournis aucun texte hors du JSON."
+            prompt, options = prompts.construire_prompt(entete, historique, consigne, OLLAMA_MODEL_ESPION)
             
             self.log("[OLLAMA] Generation de la defense")
-            
-            response = self.session.post(
-                OLLAMA_URL,
-                json={
-                    "model": OLLAMA_MODEL_ESPION,
-                    "prompt": prompt,
-                    "format": "json",
-                    "stream": False
-                },
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                reponse_ia = result.get("response", "").strip()
-                self.log(f"[OLLAMA] Reponse IA: {reponse_ia}")
-                
-                # Parser la réponse JSON
-                try:
-                    parsed = json.loads(reponse_ia)
-                    defense = parsed.get("defense", "").strip()
-                    if defense:
-                        return defense
-                except json.JSONDecodeError:
-                    self.log("[OLLAMA] Erreur de parsing JSON")
-                
-                return "Je ne suis pas l'espion, mes temperatures sont coherentes."
-            else:
-                self.log(f"[ERREUR] Ollama erreur HTTP: {response.status_code}")
-                return "Je ne suis pas l'espion, mes temperatures sont coherentes."
-                
+
+            parsed = self.ollama.generer_json(OLLAMA_MODEL_ESPION, prompt, schemas.DEFENSE, options=options, timeout=60)
+            self.log(f"[OLLAMA] Reponse IA: {parsed}")
+            return parsed["defense"].strip()
+
         except Exception as e:
             self.log(f"[ERREUR] Ollama defense: {e}")
             return "Je ne suis pas l'espion, mes temperatures sont coherentes."
 
-    def voter(self):
+    def classement_suspects(self):
+        """Classement [(capteur_id, score), ...] du détecteur statistique (soi-même exclu)
+
+        Recalculé seulement si les relevés ou les références ont changé.
+        """
+        cle = (self.releves.version, len(self.references_meteo))
+        if self._classement[0] == cle:
+            return self._classement[1]
+        lectures = dict(self.temperatures)
+        lectures[self.id] = self.mes_temperatures
+        villes = dict(self.villes_capteurs)
+        villes[self.id] = self.mes_villes
+        classement = detecteur.classer_suspects(lectures, villes, self.references_meteo, exclure=[self.id])
+        self._classement = (cle, classement)
+        return classement
+
+    def analyser_releves(self):
+        """Après chaque relevé: met à jour le classement et, à chaque round complet, le pré-vote"""
+        self.classement_suspects()
+        rounds = self.releves.rounds_complets()
+        if rounds <= self._rounds_analyses:
+            return
+        self._rounds_analyses = rounds
+        if self.pre_vote and self.mode_vote == "llm" and not self.session_ia and not self.vote_envoye:
+            prevote = (self.releves.version, None, threading.Event())
+            # Un pré-vote en attente est remplacé par celui du round le plus récent;
+            # si un pré-vote est déjà en cours, ce round n'en aura pas (vote classique)
+            if self.planifier("prevote", self.preparer_vote, prevote, remplacer=True):
+                self.prevote = prevote
+
+    def preparer_vote(self, prevote):
+        """Vote LLM anticipé (sans défense) sur les relevés de la version prévue"""
+        version, _, fini = prevote
+        try:
+            if self.prevote is not prevote:
+                return
+            self.log(f"[PRE-VOTE] Preparation sur {self.releves.rounds_complets()} rounds")
+            suspect = self.demander_vote_ollama(avec_defense=False)
+            if self.prevote is prevote:
+                self.prevote = (version, suspect, fini)
+                self.log(f"[PRE-VOTE] Pret: {suspect}")
+        finally:
+            fini.set()
+
+    def vote_anticipe(self, echeance=None):
+        """Suspect du pré-vote s'il porte sur les relevés actuels (attend sa fin, dans la limite de l'échéance)"""
+        prevote = self.prevote
+        if not prevote or prevote[0] != self.releves.version:
+            return None
+        attente = None if echeance is None else max(0.0, echeance - MARGE_VOTE - time.time())
+        if not prevote[2].wait(attente):
+            return None
+        prevote = self.prevote
+        if prevote and prevote[0] == self.releves.version:
+            return prevote[1]
+        return None
+
+    def indice_detecteur(self):
+        classement = self.classement_suspects()
+        if not classement:
+            return ""
+        return ("Indice statistique (score d'anomalie par capteur, plus haut = plus suspect): "
+                + detecteur.resume_classement(classement))
+
+    def vote_heuristique(self):
+        """Vote local sans LLM: le capteur le mieux classé par le détecteur statistique"""
+        classement = self.classement_suspects()
+        if not classement or classement[0][1] <= 0:
+            return None
+        return classement[0][0]
+
+    def candidats_vote(self):
+        """Capteurs pour lesquels on peut voter (tous sauf soi-même)"""
+        candidates = list({*self.temperatures.keys(), *self.all_capteurs})
+        return [c for c in candidates if c != self.id]
+
+    def voter(self, echeance=None):
         if self.vote_envoye:
             return
         
@@ -273,15 +500,28 @@ class Capteur:
         
         # Voter avec ou sans défense selon le round
         avec_defense = self.vote_round == 2 and self.defense_recue is not None
-        espion_presume = self.demander_vote_ollama(avec_defense=avec_defense)
+        if self.mode_vote == "detecteur":
+            espion_presume = self.vote_heuristique()
+            self.log(f"[VOTE] Detecteur statistique: {detecteur.resume_classement(self.classement_suspects())}")
+        elif self.mode_vote == "ensemble":
+            espion_presume = self.demander_vote_ensemble(avec_defense=avec_defense, echeance=echeance)
+        else:
+            espion_presume = None if avec_defense else self.vote_anticipe(echeance)
+            if espion_presume:
+                self.log(f"[VOTE] Pre-vote reutilise: {espion_presume}")
+            else:
+                espion_presume = self.demander_vote_ollama(avec_defense=avec_defense, echeance=echeance)
 
         # Build candidate list excluding self
-        candidates = list({*self.temperatures.keys(), *self.all_capteurs})
-        candidates = [c for c in candidates if c != self.id]
+        candidates = self.candidats_vote()
 
         if not espion_presume:
-            self.log("[VOTE] Ollama indisponible, choix aléatoire parmi candidats")
-            espion_presume = random.choice(candidates) if candidates else "aucun"
+            espion_presume = self.vote_heuristique()
+            if espion_presume:
+                self.log("[VOTE] Ollama indisponible, vote heuristique")
+            else:
+                self.log("[VOTE] Ollama indisponible, choix aléatoire parmi candidats")
+                espion_presume = random.choice(candidates) if candidates else "aucun"
         else:
             # If IA suggests self, prevent auto-vote
             if str(espion_presume) == str(self.id):
@@ -307,7 +547,10 @@ class Capteur:
             client.subscribe("iot/defense")
             client.subscribe("iot/temperature/#")
             client.subscribe("iot/resultats")
+            client.subscribe("iot/partie")
             client.publish(f"iot/connexion/{self.id}", "connected", qos=1)
+            CHRONO_DEMARRAGE.marquer("connecte MQTT")
+            self.afficher_rapport_demarrage()
         else:
             self.log(f"[ERREUR] Connexion echouee: code {rc}")
 
@@ -318,12 +561,44 @@ class Capteur:
         if temp:
             data = {"ville": self.ville, "temperature": temp, "round": self.round_count}
             self.client.publish(f"iot/temperature/{self.id}", json.dumps(data), qos=1)
-            self.mes_temperatures.append(temp)
+            self.releves.enregistrer(self.id, self.round_count, temp, self.ville)
             self.log(f"[TEMP] Round {self.round_count}: {temp} degres pour {self.ville}")
+            self.marquer_modifie()
+            self.alimenter_session_ia()
+            self.analyser_releves()
+            self.verifier_fin_rounds()
         else:
             self.log("[ERREUR] Recuperation temperature impossible")
 
+    def verifier_fin_rounds(self):
+        """Planifie le vote dès que tous les relevés de la partie sont arrivés"""
+        if self.round_count >= NB_ROUNDS and not self.vote_envoye and self.releves.complet_jusqua(NB_ROUNDS):
+            self.planifier("vote", self.voter, delai=2.0)
+
+    def echeance_vote(self, payload):
+        """Extrait l'échéance d'une demande de vote (None pour l'ancien format texte)
+
+        Le délai relatif fait foi; l'échéance absolue du serveur n'est retenue
+        que si nos horloges concordent à TOLERANCE_HORLOGE près.
+        """
+        try:
+            demande = json.loads(payload)
+            delai = float(demande["delai"])
+        except (ValueError, TypeError, KeyError):
+            return None
+        echeance = time.time() + delai
+        echeance_serveur = demande.get("echeance")
+        if isinstance(echeance_serveur, (int, float)) and abs(echeance_serveur - echeance) <= TOLERANCE_HORLOGE:
+            echeance = min(echeance, echeance_serveur)
+        return echeance
+
     def on_message(self, client, userdata, msg):
+        try:
+            self._traiter_message(client, userdata, msg)
+        finally:
+            self.marquer_modifie()
+
+    def _traiter_message(self, client, userdata, msg):
         payload = msg.payload.decode("utf-8")
 
         if msg.topic == f"iot/role/{self.id}":
@@ -332,12 +607,28 @@ class Capteur:
             self.results = None
             self.vote_round = 1
             self.defense_recue = None
+            self.defense_analyse = None
+            self.ouvrir_session_ia()
+
+        elif msg.topic == "iot/partie":
+            try:
+                partie = json.loads(payload)
+                villes = partie.get("villes", [])
+            except (ValueError, AttributeError):
+                partie, villes = {}, []
+            try:
+                self.meteo.changer_fournisseur(partie.get("meteo", meteo.FOURNISSEUR_DEFAUT))
+            except (ValueError, OSError) as e:
+                self.log(f"[ERREUR] Fournisseur meteo: {e}")
+            if villes:
+                self.log(f"[PARTIE] {len(villes)} villes possibles, prechargement meteo")
+                self.planifier("meteo", self.precharger_meteo, villes)
 
         elif msg.topic == f"iot/ville/{self.id}":
             self.ville = payload.strip()
             self.round_count += 1
             self.log(f"[VILLE] Round {self.round_count}: {self.ville}")
-            threading.Thread(target=self.envoyer_temperature, daemon=True).start()
+            self.planifier("releve", self.envoyer_temperature)
 
         elif msg.topic.startswith("iot/temperature/"):
             capteur_id = msg.topic.split("/")[-1]
@@ -349,38 +640,46 @@ class Capteur:
             try:
                 data = json.loads(payload)
                 temp = data.get("temperature")
-                round_num = data.get("round", 0)
-                
-                if temp is not None:
-                    if capteur_id not in self.temperatures:
-                        self.temperatures[capteur_id] = []
-                    self.temperatures[capteur_id].append(temp)
-                    self.log(f"[RECU] {capteur_id} Round {round_num}: {temp} degres")
-                    
-                    if self.round_count >= NB_ROUNDS and not self.vote_envoye:
-                        try:
-                            min_mesures = min(len(t) for t in self.temperatures.values()) if self.temperatures else 0
-                        except ValueError:
-                            min_mesures = 0
-                        if len(self.mes_temperatures) >= NB_ROUNDS and min_mesures >= 0:
-                            threading.Timer(2.0, self.voter).start()
-            except:
-                pass
+                # Ancien format sans round: on suppose le round courant
+                round_num = int(data.get("round") or self.round_count)
+            except (ValueError, TypeError, AttributeError):
+                self.log(f"[ERREUR] Temperature illisible de {capteur_id}: {payload}")
+                return
+
+            if temp is None or round_num < 1:
+                return
+            if not self.releves.enregistrer(capteur_id, round_num, temp, data.get("ville")):
+                return  # redélivrance QoS 1
+            self.log(f"[RECU] {capteur_id} Round {round_num}: {temp} degres")
+            # Une analyse en échec ne doit pas empêcher le déclenchement du vote
+            for etape in (self.alimenter_session_ia, self.analyser_releves):
+                try:
+                    etape()
+                except Exception as e:
+                    self.log(f"[ERREUR] {etape.__name__}: {e}")
+            self.verifier_fin_rounds()
 
         elif msg.topic == "iot/demande_vote":
-            self.log("[SERVEUR] Demande de vote recue")
+            echeance = self.echeance_vote(payload)
+            if echeance is not None:
+                self.log(f"[SERVEUR] Demande de vote recue (echeance dans {echeance - time.time():.1f}s)")
+            else:
+                self.log("[SERVEUR] Demande de vote recue")
             if not self.vote_envoye:
-                threading.Timer(0.5, self.voter).start()
+                # Remplace un vote planifié sans échéance sur réception des températures
+                self.planifier("vote", self.voter, delai=0.5, remplacer=True, echeance=echeance)
 
         elif msg.topic == "iot/defense":
             try:
                 data = json.loads(payload)
                 self.defense_recue = data
+                self.defense_analyse = None
                 self.log(f"[DEFENSE] Recu de {data['capteur_id']}: {data['defense']}")
                 
                 # Préparer le second vote
                 self.vote_envoye = False
                 self.vote_round = 2
+                self.lancer_analyse_defense()
                 
             except:
                 pass
@@ -426,14 +725,27 @@ class Capteur:
                         self.log("[MOI] Capteur defaite")
                 
                 self.log("=" * 50)
+
+                # Précision des votants de l'ensemble
+                for votes in self.votes_ensemble:
+                    self.precision.enregistrer(votes, self.results['espion'])
+                self.votes_ensemble.clear()
+
+                # Qualité des sorties structurées des modèles utilisés
+                for modele in sorted(self.ollama.sorties):
+                    self.log(f"[OLLAMA] {modele}: {self.ollama.taux_invalides(modele):.0%} de sorties invalides")
                 
                 # Reset
-                self.temperatures.clear()
-                self.mes_temperatures.clear()
+                self.releves.vider()
+                self.prevote = None
+                self._rounds_analyses = 0
                 self.round_count = 0
                 self.vote_envoye = False
                 self.vote_round = 1
                 self.defense_recue = None
+                self.defense_analyse = None
+                self.analyse_en_cours = None
+                self.session_ia = None
                 self.role = None
                 self.ville = None
                 self.all_capteurs.clear()
@@ -454,13 +766,40 @@ class Capteur:
         # placeholder: UI moved to ui.py
         pass
 
+    def demarrer_sans_ui(self):
+        """Connexion MQTT sans pygame ni boucle d'affichage (mode bot); ne bloque pas"""
+        self.log(f"[DEMARRAGE] Connexion {self.broker_ip}:{BROKER_PORT} (sans UI)")
+        self.client.connect(self.broker_ip, BROKER_PORT, 60)
+        self.client.loop_start()
+
+    def afficher_rapport_demarrage(self):
+        """Détail du démarrage (--temps-demarrage), une fois connecté et l'UI prête"""
+        if not self.rapport_demarrage:
+            return
+        if not CHRONO_DEMARRAGE.contient("connecte MQTT") or not CHRONO_DEMARRAGE.contient("init ui"):
+            return
+        self.rapport_demarrage = False
+        group(f"Temps de demarrage du capteur {self.id}", CHRONO_DEMARRAGE.rapport(), id=self.id)
+
     def start(self):
         try:
+            # Connexion MQTT d'abord, sans attendre la réponse du broker: le
+            # chargement de pygame se fait pendant l'établissement de la connexion
+            self.log(f"[DEMARRAGE] Connexion {self.broker_ip}:{BROKER_PORT}")
+            try:
+                self.client.connect_async(self.broker_ip, BROKER_PORT, 60)
+                self.client.loop_start()
+            except Exception as e:
+                self.log(f"[MQTT] Erreur de connexion (non bloquant): {e}")
 
-            # Initialiser l'UI en premier pour s'assurer que la fenêtre s'affiche
+            with CHRONO_DEMARRAGE.etape("import pygame"):
+                import pygame
             try:
-                import ui
-                ui.init_ui(self, NB_ROUNDS)
+                with CHRONO_DEMARRAGE.etape("import ui"):
+                    import ui
+                self.ui = ui
+                with CHRONO_DEMARRAGE.etape("init ui"):
+                    ui.init_ui(self, NB_ROUNDS)
                 self.log("[UI] Initialisation OK")
             except Exception as e:
                 # fallback minimal init
@@ -471,46 +810,107 @@ class Capteur:
                 self.font_big = pygame.font.Font(None, 60)
                 self.font_medium = pygame.font.Font(None, 40)
                 self.font_small = pygame.font.Font(None, 24)
+                CHRONO_DEMARRAGE.marquer("init ui")
+            self.afficher_rapport_demarrage()
 
-            # Connexion MQTT après l'UI (évite blocage si réseau lent)
-            self.log(f"[DEMARRAGE] Connexion {self.broker_ip}:{BROKER_PORT}")
-            try:
-                self.client.connect(self.broker_ip, BROKER_PORT, 60)
-                self.client.loop_start()
-            except Exception as e:
-                self.log(f"[MQTT] Erreur de connexion (non bloquant): {e}")
-
+            # Les threads MQTT réveillent la boucle par un événement pygame
+            evenement_etat = pygame.USEREVENT + 1
+            self._reveiller_ui = lambda: pygame.event.post(pygame.event.Event(evenement_etat))
             clock = pygame.time.Clock()
+            version_dessinee = None
 
             running = True
             while running:
-                for event in pygame.event.get():
-                    if event.type == QUIT:
+                # Bloque jusqu'au prochain événement (entrée ou changement d'état)
+                evenements = [pygame.event.wait(DELAI_VEILLE_UI)] + pygame.event.get()
+                for event in evenements:
+                    if event.type == pygame.QUIT:
                         running = False
-                try:
-                    import ui
-                    ui.draw_frame(self, NB_ROUNDS)
-                except Exception:
-                    # fallback simple draw to avoid crash
-                    pass
-                pygame.display.flip()
-                clock.tick(30)
+                    elif event.type in (pygame.VIDEOEXPOSE, getattr(pygame, "WINDOWEXPOSED", pygame.VIDEOEXPOSE)):
+                        self.etat_zones = None  # fenêtre à redessiner entièrement
+                        version_dessinee = None
+                # Sans changement signalé, seul le réveil périodique revérifie l'écran
+                if version_dessinee == self.version_etat and evenements[0].type != pygame.NOEVENT:
+                    continue
+                version_dessinee = self.version_etat
+                if self.ui:
+                    try:
+                        # Seules les zones modifiées sont envoyées à l'écran
+                        zones = self.ui.draw_frame(self, NB_ROUNDS)
+                        if zones:
+                            pygame.display.update(zones)
+                    except Exception:
+                        # fallback simple draw to avoid crash
+                        pass
+                # Limite la cadence quand les changements s'enchaînent
+                clock.tick(FPS_UI)
 
         except KeyboardInterrupt:
             self.log("[ARRET] Interruption utilisateur")
         finally:
+            self._reveiller_ui = None
             self.client.loop_stop()
             self.client.disconnect()
+            self.taches.arreter()
             if self.screen:
                 pygame.quit()
 
+def lancer_bots(ids, broker, multiplexer=False, **options_capteur):
+    """Lance des capteurs sans UI dans ce processus, jusqu'à Ctrl+C"""
+    nb_travailleurs = TRAVAILLEURS_MIN
+    if options_capteur.get("mode_vote", MODE_VOTE) != "detecteur":
+        nb_travailleurs = max(nb_travailleurs, TRAVAILLEURS_PAR_BOT * len(ids))
+    ressources = RessourcesPartagees(OLLAMA_HOTE, FICHIER_PRECISION, nb_travailleurs=nb_travailleurs)
+    mux = MultiplexeurMQTT(broker, BROKER_PORT) if multiplexer else None
+    bots = []
+    for cid in ids:
+        client = mux.canal(cid) if mux else None
+        bot = Capteur(cid, broker, ressources=ressources, client=client, **options_capteur)
+        bot.demarrer_sans_ui()
+        bots.append(bot)
+    if mux:
+        mux.demarrer()
+    print(f"[BOTS] {len(bots)} capteurs lances, {nb_travailleurs} travailleurs"
+          + (" sur une connexion MQTT" if mux else ""))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("[BOTS] Arret")
+    finally:
+        for bot in bots:
+            bot.client.loop_stop()
+            bot.client.disconnect()
+        if mux:
+            mux.arreter()
+        ressources.taches.arreter()
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python joueur.py <id> [broker_ip]")
+    options = [a for a in sys.argv[1:] if a.startswith("--")]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) < 1:
+        print("Usage: python joueur.py <id> [broker_ip] [--session] [--detecteur|--ensemble] [--pre-vote] [--sans-ui] [--temps-demarrage]")
+        print("       python joueur.py <prefixe> [broker_ip] --bots=<n> [--mux] [--session] [--detecteur|--ensemble]")
         sys.exit(1)
 
-    capteur_id = sys.argv[1]
-    broker = sys.argv[2] if len(sys.argv) >= 3 else BROKER_IP
-
-    capteur = Capteur(capteur_id, broker)
-    capteur.start()
\ No newline at end of file
+    capteur_id = args[0]
+    broker = args[1] if len(args) >= 2 else BROKER_IP
+    options_capteur = {
+        "mode_session": "--session" in options or OLLAMA_MODE_SESSION,
+        "mode_vote": "detecteur" if "--detecteur" in options
+                     else "ensemble" if "--ensemble" in options else MODE_VOTE,
+        "pre_vote": "--pre-vote" in options or PRE_VOTE,
+    }
+
+    nb_bots = next((int(o.split("=", 1)[1]) for o in options if o.startswith("--bots=")), 0)
+    if nb_bots:
+        ids = [f"{capteur_id}{i}" for i in range(1, nb_bots + 1)]
+        lancer_bots(ids, broker, multiplexer="--mux" in options, **options_capteur)
+    elif "--sans-ui" in options:
+        lancer_bots([capteur_id], broker, **options_capteur)
+    else:
+        with CHRONO_DEMARRAGE.etape("creation capteur"):
+            capteur = Capteur(capteur_id, broker, **options_capteur)
+        capteur.rapport_demarrage = "--temps-demarrage" in options
+        capteur.start()
\ No newline at end of file
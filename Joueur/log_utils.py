@@ -8,6 +8,7 @@ de logging avancée.
 """
 from __future__ import annotations
 import time
+from contextlib import contextmanager
 from typing import Optional
 
 
@@ -49,5 +50,40 @@ def group(title: str, lines: list[str], id: Optional[str] = None) -> None:
     sep()
 
 
+class Chrono:
+    """Mesure la durée d'étapes successives (ex: démarrage d'un joueur).
+
+    Complète `python -X importtime` pour les étapes qui ne sont pas des imports
+    (connexion MQTT, ouverture de la fenêtre).
+    """
+
+    def __init__(self):
+        self.debut = time.perf_counter()
+        self.etapes: list[tuple[str, Optional[float], float]] = []  # (nom, durée, instant relatif)
+
+    @contextmanager
+    def etape(self, nom: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            fin = time.perf_counter()
+            self.etapes.append((nom, fin - t, fin - self.debut))
+
+    def marquer(self, nom: str) -> None:
+        """Note un événement ponctuel (sans durée propre)."""
+        self.etapes.append((nom, None, time.perf_counter() - self.debut))
+
+    def contient(self, nom: str) -> bool:
+        return any(e[0] == nom for e in self.etapes)
+
+    def rapport(self) -> list[str]:
+        lignes = []
+        for nom, duree, instant in self.etapes:
+            detail = f"{duree * 1000:8.1f} ms" if duree is not None else " " * 11
+            lignes.append(f"{nom:<28}{detail}   (t+{instant * 1000:.0f} ms)")
+        return lignes
+
+
 
             # prompt += "Reponds uniquement en JSON avec le champ 'espion_presume' contenant l'ID du capteur suspect (ex: {\"espion_presume\": \"bot\"}). Ne fournis aucun texte hors du JSON."
\ No newline at end of file
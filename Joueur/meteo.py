@@ -0,0 +1,385 @@
+"""Service météo: relevés open-meteo préchargés et servis depuis la mémoire.
+
+Au début d'une partie, l'arbitre annonce les villes possibles (iot/partie).
+Les conditions actuelles de toutes ces villes sont alors récupérées en une
+seule requête forecast multi-coordonnées, puis conservées METEO_TTL secondes.
+Pendant les rounds, un relevé est une simple lecture de dictionnaire; le
+réseau n'est sollicité que pour une ville inconnue ou un relevé périmé.
+
+La source des relevés est un fournisseur interchangeable, annoncé par
+l'arbitre dans iot/partie (champ "meteo"):
+
+- "open-meteo": service en ligne (défaut);
+- "fixtures:<fichier>": rejoue un fichier {ville: {instant: temperature}};
+- "synthetique[:<graine>]": champ de températures généré, corrélé dans
+  l'espace, sans réseau;
+- "enregistreur:<fichier>": open-meteo, avec capture des réponses dans un
+  fichier de fixtures rejouable;
+- "sonde[:<dossier sysfs>]": sonde de température locale (module sonde),
+  la même mesure servant pour toutes les villes.
+
+Un relevé manquant en cours de round est demandé en mode « couvert »: si la
+première requête n'a pas répondu au bout du p90 des latences observées, une
+seconde part en parallèle et la plus rapide l'emporte. L'ensemble est borné
+par l'échéance du round; si rien n'arrive à temps, la dernière valeur connue
+de la ville (même périmée) est servie.
+"""
+from __future__ import annotations
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from geocodage import IndexGeocodage
+
+URL_PREVISION = "https://api.open-meteo.com/v1/forecast"
+
+# open-meteo rafraîchit current_weather tous les quarts d'heure
+METEO_TTL = 900.0
+DELAI_HTTP = 5
+FOURNISSEUR_DEFAUT = "open-meteo"
+# Heure du cycle journalier du fournisseur synthétique sans horloge fournie
+HEURE_SYNTHETIQUE = 15.0
+
+# Requêtes couvertes: délai avant la seconde requête tant que trop peu de
+# latences ont été mesurées pour estimer le p90
+LATENCE_COUVERTURE_DEFAUT = 1.0
+MESURES_LATENCE = 50
+MESURES_MIN_P90 = 5
+
+Coordonnees = Dict[str, Tuple[float, float]]
+
+
+class FournisseurMeteo:
+    """Source de températures courantes pour un lot de villes géocodées."""
+
+    nom = "?"
+    # Durée de validité propre au fournisseur (None: celle du service)
+    ttl: Optional[float] = None
+    # Vrai si les valeurs décrivent les villes demandées, indépendamment de
+    # ce capteur (utilisables comme références par le détecteur)
+    reference = True
+
+    def temperatures(self, coords: Coordonnees) -> Dict[str, float]:
+        """Retourne {ville: temperature} pour les villes de coords qu'il connaît."""
+        raise NotImplementedError
+
+    def fermer(self) -> None:
+        """Libère les ressources du fournisseur quand il est remplacé."""
+
+
+class OpenMeteo(FournisseurMeteo):
+    """Service open-meteo.com: une requête forecast multi-coordonnées."""
+
+    nom = "open-meteo"
+
+    def __init__(self, session):
+        self.session = session
+
+    def temperatures(self, coords: Coordonnees) -> Dict[str, float]:
+        villes = list(coords)
+        r = self.session.get(URL_PREVISION, params={
+            "latitude": ",".join(str(coords[v][0]) for v in villes),
+            "longitude": ",".join(str(coords[v][1]) for v in villes),
+            "current_weather": "true",
+        }, timeout=DELAI_HTTP)
+        r.raise_for_status()
+        donnees = r.json()
+        # Une seule coordonnée: objet simple; plusieurs: liste dans le même ordre
+        if isinstance(donnees, dict):
+            donnees = [donnees]
+        resultat = {}
+        for ville, d in zip(villes, donnees):
+            temp = d.get("current_weather", {}).get("temperature")
+            if temp is not None:
+                resultat[ville] = float(temp)
+        return resultat
+
+
+class FixturesMeteo(FournisseurMeteo):
+    """Rejoue un fichier {ville: {instant_epoch: temperature}}.
+
+    L'horloge de rejeu part du premier instant enregistré au moment de la
+    création: une partie rejouée voit les relevés dans leur ordre d'origine.
+    """
+
+    nom = "fixtures"
+
+    def __init__(self, fichier: str):
+        with open(fichier, encoding="utf-8") as f:
+            brut = json.load(f)
+        self.series = {ville: sorted((float(t), float(v)) for t, v in releves.items())
+                       for ville, releves in brut.items()}
+        instants = [s[0][0] for s in self.series.values() if s]
+        self.origine = min(instants) if instants else 0.0
+        self.depart = time.time()
+
+    def temperatures(self, coords: Coordonnees) -> Dict[str, float]:
+        instant = self.origine + (time.time() - self.depart)
+        resultat = {}
+        for ville in coords:
+            serie = self.series.get(ville)
+            if not serie:
+                continue
+            # Dernier relevé antérieur à l'instant de rejeu (le premier sinon)
+            valeur = serie[0][1]
+            for t, v in serie:
+                if t > instant:
+                    break
+                valeur = v
+            resultat[ville] = valeur
+        return resultat
+
+
+class SynthetiqueMeteo(FournisseurMeteo):
+    """Températures générées, sans réseau et reproductibles pour une graine.
+
+    Gradient nord-sud, champ régional lisse (deux villes proches ont des
+    températures proches), cycle journalier et petite variation par ville.
+    Le cycle journalier est lu à HEURE_SYNTHETIQUE, sauf si une horloge
+    (fonction rendant un instant epoch) est fournie.
+    """
+
+    nom = "synthetique"
+
+    def __init__(self, graine: int = 0, base: float = 12.0,
+                 horloge: Optional[Callable[[], float]] = None):
+        self.graine = graine
+        self.base = base
+        self.horloge = horloge
+        alea = random.Random(graine)
+        # Ondes de grande longueur (quelques centaines de km) du champ régional
+        self.ondes = [(alea.uniform(0.5, 1.5), alea.uniform(0.5, 1.5),
+                       alea.uniform(0, 2 * math.pi), alea.uniform(1.0, 3.0)) for _ in range(3)]
+
+    def temperatures(self, coords: Coordonnees) -> Dict[str, float]:
+        if self.horloge is None:
+            heure = HEURE_SYNTHETIQUE
+        else:
+            instant = time.localtime(self.horloge())
+            heure = instant.tm_hour + instant.tm_min / 60
+        journalier = 5.0 * math.sin((heure - 9) / 24 * 2 * math.pi)
+        resultat = {}
+        for ville, (lat, lon) in coords.items():
+            regional = sum(a * math.sin(kx * lat + ky * lon + phase)
+                           for kx, ky, phase, a in self.ondes)
+            local = random.Random(f"{self.graine}:{ville}").uniform(-0.5, 0.5)
+            temp = self.base - 0.7 * (lat - 45.0) + regional + journalier + local
+            resultat[ville] = round(temp, 1)
+        return resultat
+
+
+class EnregistreurMeteo(FournisseurMeteo):
+    """Relaie un autre fournisseur et ajoute ses réponses à un fichier de fixtures."""
+
+    nom = "enregistreur"
+
+    def __init__(self, source: FournisseurMeteo, fichier: str):
+        self.source = source
+        self.fichier = fichier
+        self._verrou = threading.Lock()
+
+    def temperatures(self, coords: Coordonnees) -> Dict[str, float]:
+        resultat = self.source.temperatures(coords)
+        instant = str(round(time.time()))
+        with self._verrou:
+            fixtures = {}
+            if os.path.exists(self.fichier):
+                try:
+                    with open(self.fichier, encoding="utf-8") as f:
+                        fixtures = json.load(f)
+                except (OSError, ValueError):
+                    fixtures = {}
+            for ville, temp in resultat.items():
+                fixtures.setdefault(ville, {})[instant] = temp
+            with open(self.fichier, "w", encoding="utf-8") as f:
+                json.dump(fixtures, f, ensure_ascii=False, indent=1)
+        return resultat
+
+
+class SondeMeteo(FournisseurMeteo):
+    """Température de la sonde locale, quelle que soit la ville (aucun réseau)."""
+
+    nom = "sonde"
+    ttl = 0.0  # lecture en mémoire: toujours la plus récente
+    reference = False  # notre propre mesure, la même pour toutes les villes
+
+    def __init__(self, echantillonneur):
+        self.echantillonneur = echantillonneur.demarrer()
+
+    def temperatures(self, coords: Coordonnees) -> Dict[str, float]:
+        temp = self.echantillonneur.lecture()
+        if temp is None:
+            return {}
+        return {ville: temp for ville in coords}
+
+    def fermer(self) -> None:
+        self.echantillonneur.arreter()
+
+
+def fabriquer_fournisseur(description: str, session=None) -> FournisseurMeteo:
+    """Construit un fournisseur depuis sa description ("synthetique:42", ...)."""
+    nom, _, argument = (description or FOURNISSEUR_DEFAUT).partition(":")
+    if nom == "open-meteo":
+        return OpenMeteo(session)
+    if nom == "fixtures":
+        return FixturesMeteo(argument)
+    if nom == "synthetique":
+        return SynthetiqueMeteo(int(argument) if argument else 0)
+    if nom == "enregistreur":
+        return EnregistreurMeteo(OpenMeteo(session), argument or "fixtures_meteo.json")
+    if nom == "sonde":
+        import sonde
+        sondes = [sonde.Sonde(argument)] if argument else sonde.trouver_sondes()
+        if not sondes:
+            raise ValueError("aucune sonde de temperature trouvee dans /sys")
+        return SondeMeteo(sonde.Echantillonneur(sondes[0]))
+    raise ValueError(f"fournisseur meteo inconnu: {description}")
+
+
+class ServiceMeteo:
+    """Cache des températures courantes par ville (coordonnées via IndexGeocodage)."""
+
+    def __init__(self, session, ttl: float = METEO_TTL, log: Callable[[str], None] = print,
+                 index: Optional[IndexGeocodage] = None, fournisseur: Optional[FournisseurMeteo] = None):
+        self.session = session
+        self.ttl = ttl
+        self.log = log
+        self.index = index or IndexGeocodage(session, log=log)
+        self.fournisseur = fournisseur or OpenMeteo(session)
+        self.description = FOURNISSEUR_DEFAUT
+        self._releves: Dict[str, Tuple[float, float]] = {}  # ville -> (temperature, instant)
+        self._verrou = threading.Lock()
+        # Un seul préchargement à la fois: les bots qui partagent le service
+        # attendent le premier puis lisent le cache au lieu de refaire la requête
+        self._verrou_prechargement = threading.Lock()
+        self._latences = deque(maxlen=MESURES_LATENCE)
+        self._executeur = ThreadPoolExecutor(max_workers=4, thread_name_prefix="meteo")
+
+    def changer_fournisseur(self, description: str) -> None:
+        """Passe à un autre fournisseur; les relevés en cache sont oubliés.
+
+        Sûr entre bots: un seul appel construit le nouveau fournisseur et
+        ferme l'ancien, les autres voient la description déjà à jour.
+        """
+        with self._verrou:
+            if description == self.description:
+                return
+            ancien, self.fournisseur = self.fournisseur, fabriquer_fournisseur(description, self.session)
+            self.description = description
+            self._releves.clear()
+        ancien.fermer()
+        self.log(f"[METEO] Fournisseur: {description}")
+
+    def precharger(self, villes: Iterable[str]) -> Dict[str, float]:
+        """Récupère en une requête les températures des villes absentes du cache.
+
+        Les villes non géocodables sont ignorées. Retourne {ville: temperature}
+        pour les villes demandées, valeurs encore valides du cache comprises.
+        """
+        villes = list(dict.fromkeys(villes))
+        with self._verrou_prechargement:
+            resultat = {v: t for v in villes if (t := self.en_cache(v)) is not None}
+            coords = self.index.resoudre(v for v in villes if v not in resultat)
+            if not coords:
+                return resultat
+
+            debut = time.perf_counter()
+            temperatures = self.fournisseur.temperatures(coords)
+            maintenant = time.time()
+            with self._verrou:
+                for ville, temp in temperatures.items():
+                    self._releves[ville] = (temp, maintenant)
+            self.log(f"[METEO] {len(temperatures)} villes prechargees en {time.perf_counter() - debut:.2f}s")
+            resultat.update(temperatures)
+            return resultat
+
+    def en_cache(self, ville: str) -> Optional[float]:
+        """Température encore valide pour une ville, sans accès réseau."""
+        with self._verrou:
+            releve = self._releves.get(ville)
+        ttl = self.ttl if self.fournisseur.ttl is None else self.fournisseur.ttl
+        if releve and time.time() - releve[1] < ttl:
+            return releve[0]
+        return None
+
+    def p90(self) -> float:
+        """90e centile des latences mesurées pour un relevé isolé."""
+        with self._verrou:
+            latences = sorted(self._latences)
+        if len(latences) < MESURES_MIN_P90:
+            return LATENCE_COUVERTURE_DEFAUT
+        return latences[min(len(latences) - 1, int(0.9 * len(latences)))]
+
+    def _interroger(self, ville: str, coords: Tuple[float, float]) -> float:
+        debut = time.perf_counter()
+        temps = self.fournisseur.temperatures({ville: coords})
+        with self._verrou:
+            self._latences.append(time.perf_counter() - debut)
+        if ville not in temps:
+            raise ValueError("no temperature in response")
+        return temps[ville]
+
+    def _requete_couverte(self, ville: str, echeance: Optional[float]) -> Optional[float]:
+        """Relevé isolé avec seconde requête au p90; None si rien avant l'échéance."""
+        coords = self.index.coordonnees(ville)
+
+        def restant():
+            return None if echeance is None else max(0.0, echeance - time.time())
+
+        en_cours = {self._executeur.submit(self._interroger, ville, coords)}
+        delai_couverture = self.p90() if echeance is None else min(self.p90(), restant())
+        termines, en_cours = wait(en_cours, timeout=delai_couverture)
+        if not termines:
+            self.log(f"[METEO] Pas de reponse apres {delai_couverture:.2f}s pour {ville}, requete couverte")
+            en_cours.add(self._executeur.submit(self._interroger, ville, coords))
+
+        while termines or en_cours:
+            for futur in termines:
+                try:
+                    return futur.result()
+                except Exception as e:
+                    self.log(f"[METEO] Requete en echec pour {ville}: {e}")
+            if not en_cours:
+                break
+            termines, en_cours = wait(en_cours, timeout=restant(), return_when=FIRST_COMPLETED)
+            if not termines:
+                self.log(f"[METEO] Echeance atteinte pour {ville}")
+                break
+        return None
+
+    def temperature(self, ville: str, echeance: Optional[float] = None) -> float:
+        """Température courante: depuis le cache, sinon une requête couverte.
+
+        echeance: instant (time.time()) au-delà duquel on renonce au réseau
+        pour servir la dernière valeur connue de la ville.
+        """
+        temp = self.en_cache(ville)
+        if temp is not None:
+            return temp
+        try:
+            temp = self._requete_couverte(ville, echeance)
+        except Exception as e:
+            self.log(f"[METEO] Releve impossible pour {ville}: {e}")
+            temp = None
+        if temp is not None:
+            with self._verrou:
+                self._releves[ville] = (temp, time.time())
+            return temp
+        with self._verrou:
+            dernier = self._releves.get(ville)
+        if dernier is None:
+            raise ValueError(f"aucun releve disponible pour {ville}")
+        self.log(f"[METEO] Derniere valeur connue servie pour {ville}")
+        return dernier[0]
+
+    def releves(self) -> Dict[str, float]:
+        """Températures valides de toutes les villes en cache."""
+        with self._verrou:
+            villes = list(self._releves)
+        return {v: t for v in villes if (t := self.en_cache(v)) is not None}
@@ -0,0 +1,345 @@
+"""Client Ollama partagé par les capteurs.
+
+Regroupe les appels HTTP vers le serveur Ollama (/api/generate et
+/api/chat) et fournit SessionChat, une conversation persistante par
+joueur: les mesures sont ajoutées au fil des rounds et le serveur peut
+réutiliser le contexte déjà calculé (cache KV) au lieu de tout relire
+à chaque vote.
+
+Chaque modèle est protégé par un disjoncteur: quand sa latence ou son
+taux d'erreur sort de l'objectif, les appels basculent sur un modèle de
+secours plus petit, puis des essais isolés vérifient le rétablissement.
+Si aucun modèle n'est disponible, ModeleIndisponible est levée tout de
+suite pour que l'appelant utilise son vote local.
+
+Les appels acceptent une échéance absolue (time.time()): le timeout est
+raccourci pour la respecter et EcheanceDepassee est levée si le temps
+restant est déjà écoulé.
+
+generer_json / SessionChat.demander_json envoient un schéma JSON (voir
+schemas.py) comme format, valident la réponse et la réparent localement
+si besoin; les taux de sorties réparées et invalides sont comptés par
+modèle.
+
+requests n'est importé qu'au premier appel HTTP (SessionDifferee): son
+import coûte l'essentiel du démarrage du joueur, avant la connexion MQTT.
+"""
+from __future__ import annotations
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import schemas
+
+# Durée pendant laquelle Ollama garde le modèle (et son cache) chargé
+KEEP_ALIVE = "30m"
+
+# Objectif de latence (secondes) par modèle; un appel est coupé à 2x l'objectif
+SLO_LATENCE = {
+    "gemma3:4b": 8.0,
+    "gemma3:1b": 4.0,
+    "gpt-oss:20b": 20.0,
+}
+SLO_LATENCE_DEFAUT = 10.0
+
+# Modèle plus léger essayé quand le disjoncteur d'un modèle est ouvert
+MODELES_SECOURS = {
+    "gpt-oss:20b": "gemma3:4b",
+    "gemma3:4b": "gemma3:1b",
+}
+
+DELAI_CONNEXION = 2.0
+
+
+class ErreurOllama(Exception):
+    """Réponse inexploitable du serveur Ollama (statut HTTP, corps invalide)."""
+
+
+class ModeleIndisponible(ErreurOllama):
+    """Aucun modèle de la chaîne de secours n'est utilisable."""
+
+
+class EcheanceDepassee(ErreurOllama):
+    """Plus assez de temps avant l'échéance pour interroger un modèle."""
+
+
+class ReponseInvalide(ErreurOllama):
+    """Sortie du modèle non conforme au schéma, même après réparation."""
+
+
+class Disjoncteur:
+    """Disjoncteur d'un modèle sur une fenêtre glissante d'appels.
+
+    fermé: les appels passent. Ouvert: les appels sont refusés pendant
+    delai_reessai secondes. Semi-ouvert: un seul appel d'essai passe; son
+    succès referme le disjoncteur, son échec le rouvre.
+    """
+    FERME = "ferme"
+    OUVERT = "ouvert"
+    SEMI_OUVERT = "semi_ouvert"
+
+    def __init__(self, slo_latence: float, taux_erreur_max: float = 0.5, fenetre: int = 10,
+                 min_appels: int = 3, delai_reessai: float = 30.0):
+        self.slo_latence = slo_latence
+        self.taux_erreur_max = taux_erreur_max
+        self.min_appels = min_appels
+        self.delai_reessai = delai_reessai
+        self.appels = deque(maxlen=fenetre)  # (latence, succes)
+        self.etat = self.FERME
+        self.ouvert_depuis = 0.0
+        self.essai_en_cours = False
+        self._verrou = threading.Lock()
+
+    def autorise(self) -> bool:
+        with self._verrou:
+            if self.etat == self.OUVERT and time.time() - self.ouvert_depuis >= self.delai_reessai:
+                self.etat = self.SEMI_OUVERT
+                self.essai_en_cours = False
+            if self.etat == self.FERME:
+                return True
+            if self.etat == self.SEMI_OUVERT and not self.essai_en_cours:
+                self.essai_en_cours = True
+                return True
+            return False
+
+    def enregistrer(self, latence: float, succes: bool) -> Optional[str]:
+        """Enregistre un appel; retourne le nouvel état s'il a changé."""
+        with self._verrou:
+            avant = self.etat
+            self.appels.append((latence, succes and latence <= self.slo_latence))
+            if self.etat == self.SEMI_OUVERT:
+                self.essai_en_cours = False
+                if succes and latence <= self.slo_latence:
+                    self.etat = self.FERME
+                    self.appels.clear()
+                else:
+                    self._ouvrir()
+            elif self.etat == self.FERME and self._hors_objectif():
+                self._ouvrir()
+            return self.etat if self.etat != avant else None
+
+    def est_ferme(self) -> bool:
+        """Vrai si les appels passent, sans réserver l'essai d'un état semi-ouvert."""
+        with self._verrou:
+            return self.etat == self.FERME
+
+    def abandonner(self):
+        """Libère l'essai semi-ouvert sans compter l'appel (coupé par l'appelant)."""
+        with self._verrou:
+            self.essai_en_cours = False
+
+    def _ouvrir(self):
+        self.etat = self.OUVERT
+        self.ouvert_depuis = time.time()
+
+    def _hors_objectif(self) -> bool:
+        if len(self.appels) < self.min_appels:
+            return False
+        echecs = sum(1 for _, ok in self.appels if not ok)
+        latences = sorted(l for l, _ in self.appels)
+        p90 = latences[min(len(latences) - 1, int(len(latences) * 0.9))]
+        return echecs / len(self.appels) > self.taux_erreur_max or p90 > self.slo_latence
+
+
+class SessionDifferee:
+    """requests.Session créée (et requests importé) au premier usage.
+
+    Se partage comme une session ordinaire entre météo, géocodage et Ollama.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._verrou = threading.Lock()
+
+    def __getattr__(self, nom):
+        if self._session is None:
+            with self._verrou:
+                if self._session is None:
+                    import requests
+                    self._session = requests.Session()
+        return getattr(self._session, nom)
+
+
+class ClientOllama:
+    def __init__(self, hote: str, session=None, log: Callable[[str], None] = print):
+        self.hote = hote.rstrip("/")
+        self.session = session or SessionDifferee()
+        self.log = log
+        self.disjoncteurs: Dict[str, Disjoncteur] = {}
+        # Par modèle: nombre de sorties structurées, réparées et invalides
+        self.sorties: Dict[str, Dict[str, int]] = {}
+        self._verrou = threading.Lock()
+
+    def disjoncteur(self, modele: str) -> Disjoncteur:
+        with self._verrou:
+            if modele not in self.disjoncteurs:
+                self.disjoncteurs[modele] = Disjoncteur(SLO_LATENCE.get(modele, SLO_LATENCE_DEFAUT))
+            return self.disjoncteurs[modele]
+
+    def chaine_secours(self, modele: str) -> List[str]:
+        chaine = [modele]
+        while MODELES_SECOURS.get(chaine[-1]) and MODELES_SECOURS[chaine[-1]] not in chaine:
+            chaine.append(MODELES_SECOURS[chaine[-1]])
+        return chaine
+
+    def _post(self, chemin: str, corps: dict, timeout: float) -> dict:
+        response = self.session.post(f"{self.hote}{chemin}", json=corps, timeout=(DELAI_CONNEXION, timeout))
+        if response.status_code != 200:
+            raise ErreurOllama(f"HTTP {response.status_code}")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise ErreurOllama(f"corps JSON invalide: {e}")
+
+    def _appeler(self, modele: str, chemin: str, corps: dict, timeout: float,
+                 echeance: Optional[float] = None, speculatif: bool = False) -> dict:
+        """Envoie la requête au premier modèle de la chaîne dont le disjoncteur l'autorise.
+
+        speculatif: appel dont le résultat peut être abandonné; il ne passe
+        que par un disjoncteur fermé et n'en modifie jamais l'état.
+        """
+        import requests  # chargé par la session au premier appel
+        derniere_erreur = None
+        for candidat in self.chaine_secours(modele):
+            restant = echeance - time.time() if echeance is not None else timeout
+            if restant <= 0:
+                raise EcheanceDepassee(f"echeance atteinte avant l'appel a {candidat}")
+            disj = self.disjoncteur(candidat)
+            if not (disj.est_ferme() if speculatif else disj.autorise()):
+                continue
+            if candidat != modele:
+                self.log(f"[OLLAMA] Bascule {modele} -> {candidat}")
+            delai = min(timeout, 2 * disj.slo_latence, restant)
+            t0 = time.time()
+            try:
+                resultat = self._post(chemin, dict(corps, model=candidat), delai)
+                changement = None if speculatif else disj.enregistrer(time.time() - t0, True)
+            except (requests.RequestException, ErreurOllama) as e:
+                derniere_erreur = e
+                resultat = None
+                if speculatif:
+                    changement = None
+                elif isinstance(e, requests.Timeout) and delai < disj.slo_latence:
+                    # Coupé par notre échéance avant l'objectif: pas la faute du modèle
+                    disj.abandonner()
+                    changement = None
+                else:
+                    changement = disj.enregistrer(time.time() - t0, False)
+            if changement:
+                self.log(f"[OLLAMA] Disjoncteur {candidat}: {changement}")
+            if resultat is not None:
+                return resultat
+        raise ModeleIndisponible(f"aucun modele disponible pour {modele} ({derniere_erreur})")
+
+    def _generate(self, modele, prompt, options, format, timeout, echeance, speculatif=False):
+        corps = {"model": modele, "prompt": prompt, "stream": False, "keep_alive": KEEP_ALIVE}
+        if format:
+            corps["format"] = format
+        if options:
+            corps["options"] = options
+        resultat = self._appeler(modele, "/api/generate", corps, timeout, echeance, speculatif)
+        return (resultat.get("response") or "").strip(), resultat.get("model") or modele
+
+    def _chat(self, modele, messages, options, format, timeout, echeance):
+        corps = {"model": modele, "messages": messages, "stream": False, "keep_alive": KEEP_ALIVE}
+        if format:
+            corps["format"] = format
+        if options:
+            corps["options"] = options
+        resultat = self._appeler(modele, "/api/chat", corps, timeout, echeance)
+        message = resultat.get("message") or {}
+        return (message.get("content") or "").strip(), resultat.get("model") or modele
+
+    def chat(self, modele: str, messages: List[Dict[str, str]], options: Optional[dict] = None,
+             format="json", timeout: float = 60, echeance: Optional[float] = None) -> str:
+        """Appel /api/chat non streamé; retourne le contenu du message assistant."""
+        return self._chat(modele, messages, options, format, timeout, echeance)[0]
+
+    def generer_json(self, modele: str, prompt: str, schema: dict, options: Optional[dict] = None,
+                     timeout: float = 60, echeance: Optional[float] = None, speculatif: bool = False) -> dict:
+        """Génération contrainte par un schéma; retourne l'objet validé.
+
+        speculatif: voir _appeler (le disjoncteur n'est ni consulté en essai ni mis à jour).
+        """
+        texte, modele_utilise = self._generate(modele, prompt, options, schema, timeout, echeance, speculatif)
+        return self.decoder(texte, schema, modele_utilise)
+
+    def decoder(self, texte: str, schema: dict, modele: str) -> dict:
+        """Valide une sortie de modèle contre son schéma, avec réparation locale."""
+        with self._verrou:
+            stats = self.sorties.setdefault(modele, {"appels": 0, "reparees": 0, "invalides": 0})
+            stats["appels"] += 1
+        try:
+            obj = json.loads(texte)
+        except ValueError:
+            obj = None
+        if obj is not None and schemas.valider(obj, schema):
+            return obj
+
+        obj = schemas.reparer(texte, schema)
+        with self._verrou:
+            stats["reparees" if obj is not None else "invalides"] += 1
+        if obj is None:
+            raise ReponseInvalide(f"sortie non conforme de {modele}: {texte[:200]}")
+        self.log(f"[OLLAMA] Sortie de {modele} reparee localement")
+        return obj
+
+    def taux_invalides(self, modele: str) -> float:
+        """Part des sorties structurées de ce modèle inutilisables même après réparation."""
+        stats = self.sorties.get(modele)
+        if not stats or not stats["appels"]:
+            return 0.0
+        return stats["invalides"] / stats["appels"]
+
+
+class SessionChat:
+    """Conversation persistante avec un modèle, alimentée round par round.
+
+    Les messages ne sont jamais réécrits, seulement ajoutés: chaque requête
+    partage donc le préfixe de la précédente et Ollama n'a à traiter que
+    les nouveaux messages.
+    """
+
+    def __init__(self, client: ClientOllama, modele: str, systeme: str, options: Optional[dict] = None):
+        self.client = client
+        self.modele = modele
+        self.options = options or {}
+        self.messages: List[Dict[str, str]] = [{"role": "system", "content": systeme}]
+        self.rounds_envoyes = 0
+        self._verrou = threading.Lock()
+
+    def ajouter(self, contenu: str) -> None:
+        """Ajoute un message utilisateur sans interroger le modèle."""
+        with self._verrou:
+            self.messages.append({"role": "user", "content": contenu})
+
+    def prechauffer(self, timeout: float = 60, echeance: Optional[float] = None) -> None:
+        """Fait traiter la conversation actuelle pour remplir le cache du serveur.
+
+        Une seule prédiction est demandée et la réponse n'est pas conservée.
+        Le verrou n'est pas gardé pendant l'appel: ajouter() reste immédiat.
+        """
+        with self._verrou:
+            messages = list(self.messages)
+        options = dict(self.options, num_predict=1)
+        self.client.chat(self.modele, messages, options=options, format=None,
+                         timeout=timeout, echeance=echeance)
+
+    def demander_json(self, question: str, schema: dict, timeout: float = 60,
+                      echeance: Optional[float] = None) -> dict:
+        """Pose une question à réponse contrainte et validée par un schéma.
+
+        La question et la réponse restent dans l'historique, à la suite des
+        messages connus au moment de la question (ceux ajoutés pendant
+        l'appel viennent après).
+        """
+        with self._verrou:
+            envoyes = len(self.messages)
+            messages = self.messages + [{"role": "user", "content": question}]
+        reponse, modele_utilise = self.client._chat(self.modele, messages, self.options, schema,
+                                                    timeout, echeance)
+        with self._verrou:
+            self.messages = messages + [{"role": "assistant", "content": reponse}] + self.messages[envoyes:]
+        return self.client.decoder(reponse, schema, modele_utilise)
@@ -0,0 +1,133 @@
+"""Construction compacte des prompts Ollama.
+
+L'historique des températures est rendu sous forme de tableau (une ligne
+par capteur, une colonne par round) au lieu d'une ligne par mesure.
+Le module estime la taille du prompt en tokens et applique un budget par
+modèle: si le tableau dépasse, les rounds les plus anciens sont résumés
+dans une seule colonne « moyenne (min/max) ». La taille du prompt reste
+ainsi bornée quel que soit le nombre de rounds.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+
+# Budget par modèle. num_ctx reste fixe pour un modèle donné: le changer
+# d'un appel à l'autre force Ollama à recharger le modèle.
+BUDGETS_MODELES = {
+    "gemma3:4b": {"num_ctx": 2048, "num_predict": 160},
+    "gpt-oss:20b": {"num_ctx": 4096, "num_predict": 320},
+}
+BUDGET_DEFAUT = {"num_ctx": 2048, "num_predict": 160}
+
+# Estimation sans tokenizer: les chiffres et séparateurs du tableau coûtent
+# chacun un token (gemma découpe les nombres chiffre par chiffre), le reste
+# du texte environ un token pour CARACTERES_PAR_TOKEN caractères
+CARACTERES_PAR_TOKEN = 3.0
+CARACTERES_UNITAIRES = frozenset("0123456789.|-()/\n")
+MARGE_TOKENS = 64
+
+# Nombre minimal de rounds gardés en détail quand on résume
+ROUNDS_DETAIL_MIN = 1
+
+
+def estimer_tokens(texte: str) -> int:
+    """Estime le nombre de tokens d'un texte sans tokenizer (par excès pour les tableaux)."""
+    unitaires = sum(1 for c in texte if c in CARACTERES_UNITAIRES)
+    return unitaires + int((len(texte) - unitaires) / CARACTERES_PAR_TOKEN) + 1
+
+
+def budget_modele(modele: str) -> Dict[str, int]:
+    """Retourne le budget (num_ctx, num_predict) configuré pour un modèle."""
+    return dict(BUDGETS_MODELES.get(modele, BUDGET_DEFAUT))
+
+
+def _valeur(t) -> str:
+    if t is None:
+        return "--"
+    try:
+        return f"{float(t):.1f}"
+    except (TypeError, ValueError):
+        return str(t)
+
+
+def _resume(valeurs: List) -> str:
+    nums = []
+    for v in valeurs:
+        try:
+            nums.append(float(v))
+        except (TypeError, ValueError):
+            continue
+    if not nums:
+        return "--"
+    moyenne = sum(nums) / len(nums)
+    return f"{moyenne:.1f}({min(nums):.1f}/{max(nums):.1f})"
+
+
+def tableau_temperatures(historique: Dict[str, List], rounds_detail: Optional[int] = None) -> str:
+    """Rend l'historique {capteur_id: [t_round1, t_round2, ...]} en tableau.
+
+    rounds_detail: nombre de rounds récents affichés en détail. Les rounds
+    plus anciens sont regroupés dans une colonne « R1-k moy(min/max) ».
+    None affiche tous les rounds.
+    """
+    nb_rounds = max((len(t) for t in historique.values()), default=0)
+    if rounds_detail is None or rounds_detail >= nb_rounds:
+        debut = 0
+    else:
+        debut = nb_rounds - max(rounds_detail, 0)
+
+    entetes = ["capteur"]
+    if debut > 0:
+        entetes.append(f"R1-{debut} moy(min/max)")
+    entetes += [f"R{i + 1}" for i in range(debut, nb_rounds)]
+
+    lignes = ["|".join(entetes)]
+    for cid, temps in sorted(historique.items()):
+        cellules = [str(cid)]
+        if debut > 0:
+            cellules.append(_resume(temps[:debut]))
+        cellules += [_valeur(temps[i] if i < len(temps) else None) for i in range(debut, nb_rounds)]
+        lignes.append("|".join(cellules))
+    return "\n".join(lignes)
+
+
+def construire_prompt(entete: str, historique: Dict[str, List], consigne: str,
+                      modele: str, texte_libre: str = "") -> Tuple[str, Dict[str, int]]:
+    """Assemble un prompt borné pour un modèle et les options Ollama associées.
+
+    entete: contexte placé avant le tableau.
+    consigne: question et format de réponse attendus, placés à la fin.
+    texte_libre: texte variable (ex: défense) inséré entre le tableau et la
+    consigne; tronqué en dernier recours si le budget reste dépassé.
+
+    Retourne (prompt, options) où options contient num_ctx et num_predict.
+    """
+    budget = budget_modele(modele)
+    limite = budget["num_ctx"] - budget["num_predict"] - MARGE_TOKENS
+
+    def assembler(rounds_detail):
+        tableau = tableau_temperatures(historique, rounds_detail)
+        return tableau, "\n\n".join(m for m in (entete, tableau, texte_libre, consigne) if m)
+
+    # Recherche dichotomique du plus grand nombre de rounds détaillés qui tient
+    nb_rounds = max((len(t) for t in historique.values()), default=0)
+    tableau, prompt = assembler(nb_rounds)
+    if estimer_tokens(prompt) > limite and nb_rounds > ROUNDS_DETAIL_MIN:
+        bas, haut = ROUNDS_DETAIL_MIN, nb_rounds - 1
+        while bas < haut:
+            milieu = (bas + haut + 1) // 2
+            if estimer_tokens(assembler(milieu)[1]) <= limite:
+                bas = milieu
+            else:
+                haut = milieu - 1
+        tableau, prompt = assembler(bas)
+
+    depassement = estimer_tokens(prompt) - limite
+    garde = len(texte_libre)
+    while depassement > 0 and garde > 0:
+        # Un token retiré vaut au moins un caractère: on recommence si cela ne suffit pas
+        garde = max(0, garde - int(depassement * CARACTERES_PAR_TOKEN))
+        libre = texte_libre[:garde].rstrip() + "..."
+        prompt = "\n\n".join(m for m in (entete, tableau, libre, consigne) if m)
+        depassement = estimer_tokens(prompt) - limite
+
+    return prompt, {"num_ctx": budget["num_ctx"], "num_predict": budget["num_predict"]}
@@ -0,0 +1,96 @@
+"""Relevés de la partie indexés par (capteur, round).
+
+Chaque capteur a un tableau de largeur fixe (un emplacement par round).
+Un relevé est rangé à l'emplacement de son round, si bien qu'un message
+redélivré (QoS 1) ou arrivé dans le désordre ne décale pas l'alignement
+des rounds dont dépendent les prompts et le détecteur. L'enregistrement
+est idempotent, et le nombre de rounds complets en tête de chaque tableau
+est tenu à jour pour répondre sans parcours à « complet jusqu'au round r ? ».
+"""
+from __future__ import annotations
+import threading
+from typing import Dict, Iterable, List, Optional
+
+
+class MagasinReleves:
+    """Températures et villes par capteur et par round (rounds numérotés à partir de 1)."""
+
+    def __init__(self, nb_rounds: int):
+        self.nb_rounds = nb_rounds
+        self._temps: Dict[str, List[Optional[float]]] = {}
+        self._villes: Dict[str, List[Optional[str]]] = {}
+        self._prefixe: Dict[str, int] = {}  # rounds consécutifs reçus depuis le round 1
+        self.version = 0  # incrémentée à chaque changement (clé des calculs mis en cache)
+        self._verrou = threading.Lock()
+
+    def _ligne(self, cid: str, largeur: int) -> None:
+        if cid not in self._temps:
+            self._temps[cid] = [None] * self.nb_rounds
+            self._villes[cid] = [None] * self.nb_rounds
+            self._prefixe[cid] = 0
+        manque = largeur - len(self._temps[cid])
+        if manque > 0:
+            self._temps[cid].extend([None] * manque)
+            self._villes[cid].extend([None] * manque)
+
+    def enregistrer(self, cid: str, round_num: int, temperature: float, ville: Optional[str] = None) -> bool:
+        """Range un relevé; retourne False s'il était déjà connu à l'identique."""
+        if round_num < 1:
+            raise ValueError(f"round invalide: {round_num}")
+        with self._verrou:
+            self._ligne(cid, round_num)
+            i = round_num - 1
+            temps = self._temps[cid]
+            if temps[i] == temperature and self._villes[cid][i] == ville:
+                return False
+            temps[i] = temperature
+            self._villes[cid][i] = ville
+            self.version += 1
+            prefixe = self._prefixe[cid]
+            while prefixe < len(temps) and temps[prefixe] is not None:
+                prefixe += 1
+            self._prefixe[cid] = prefixe
+            return True
+
+    def rounds_complets(self, joueurs: Optional[Iterable[str]] = None) -> int:
+        """Nombre de rounds reçus pour tous les capteurs (tous les capteurs connus par défaut)."""
+        with self._verrou:
+            if joueurs is None:
+                joueurs = self._prefixe
+            return min((self._prefixe.get(cid, 0) for cid in joueurs), default=0)
+
+    def complet_jusqua(self, round_num: int, joueurs: Optional[Iterable[str]] = None) -> bool:
+        """Vrai si chaque capteur a ses relevés des rounds 1 à round_num."""
+        return self.rounds_complets(joueurs) >= round_num
+
+    def _rogner(self, valeurs: list) -> list:
+        fin = len(valeurs)
+        while fin and valeurs[fin - 1] is None:
+            fin -= 1
+        return valeurs[:fin]
+
+    def serie(self, cid: str) -> List[Optional[float]]:
+        """Températures d'un capteur par round (None si absente), sans les rounds à venir."""
+        with self._verrou:
+            return self._rogner(self._temps.get(cid, []))
+
+    def villes(self, cid: str) -> List[Optional[str]]:
+        with self._verrou:
+            return self._villes.get(cid, [])[:len(self._rogner(self._temps.get(cid, [])))]
+
+    def series(self, exclure: Iterable[str] = ()) -> Dict[str, List[Optional[float]]]:
+        """{capteur: serie} des capteurs ayant au moins un relevé."""
+        exclus = set(exclure)
+        with self._verrou:
+            ids = [cid for cid in self._temps if cid not in exclus]
+        return {cid: s for cid in ids if (s := self.serie(cid))}
+
+    def series_villes(self, exclure: Iterable[str] = ()) -> Dict[str, List[Optional[str]]]:
+        return {cid: self.villes(cid) for cid in self.series(exclure)}
+
+    def vider(self) -> None:
+        with self._verrou:
+            self._temps.clear()
+            self._villes.clear()
+            self._prefixe.clear()
+            self.version += 1
@@ -0,0 +1,143 @@
+"""Schémas JSON des réponses attendues d'Ollama et réparation locale.
+
+Les schémas sont envoyés dans le champ "format" des requêtes Ollama pour
+contraindre la génération. La réponse est ensuite validée ici; une sortie
+légèrement malformée (bloc ```json, virgule en trop, apostrophes, champ mal
+nommé, casse d'un identifiant) est réparée localement au lieu de relancer
+une génération complète.
+"""
+from __future__ import annotations
+import json
+import re
+from typing import Iterable, Optional
+
+ANALYSE = {
+    "type": "object",
+    "properties": {
+        "credible": {"type": "boolean"},
+        "analyse": {"type": "string"},
+    },
+    "required": ["credible", "analyse"],
+}
+
+DEFENSE = {
+    "type": "object",
+    "properties": {
+        "defense": {"type": "string", "minLength": 1},
+    },
+    "required": ["defense"],
+}
+
+
+def schema_vote(candidats: Iterable[str] = (), avec_analyse: bool = False) -> dict:
+    """Schéma d'un vote; l'identifiant est restreint aux candidats connus."""
+    suspect = {"type": "string", "minLength": 1}
+    candidats = sorted(str(c) for c in candidats)
+    if candidats:
+        suspect["enum"] = candidats
+    schema = {
+        "type": "object",
+        "properties": {"espion_presume": suspect},
+        "required": ["espion_presume"],
+    }
+    if avec_analyse:
+        schema["properties"].update(ANALYSE["properties"])
+        schema["required"] = ANALYSE["required"] + ["espion_presume"]
+    return schema
+
+
+_TYPES = {
+    "object": dict,
+    "string": str,
+    "boolean": bool,
+    "array": list,
+}
+
+
+def valider(obj, schema: dict) -> bool:
+    """Validation minimale (type, required, enum, minLength) suffisante pour nos schémas."""
+    type_attendu = schema.get("type")
+    if type_attendu == "number":
+        if not isinstance(obj, (int, float)) or isinstance(obj, bool):
+            return False
+    elif type_attendu in _TYPES and not isinstance(obj, _TYPES[type_attendu]):
+        return False
+    if "enum" in schema and obj not in schema["enum"]:
+        return False
+    if isinstance(obj, str) and len(obj.strip()) < schema.get("minLength", 0):
+        return False
+    if isinstance(obj, dict):
+        for cle in schema.get("required", []):
+            if cle not in obj:
+                return False
+        for cle, sous_schema in schema.get("properties", {}).items():
+            if cle in obj and not valider(obj[cle], sous_schema):
+                return False
+    return True
+
+
+def _charger(texte: str):
+    """Essaie de lire du JSON dans un texte approximatif; None si impossible."""
+    texte = texte.strip()
+    texte = re.sub(r"^```(?:json)?\s*|\s*```$", "", texte)
+    debut, fin = texte.find("{"), texte.rfind("}")
+    if debut != -1 and fin > debut:
+        texte = texte[debut:fin + 1]
+    essais = [texte, re.sub(r",\s*([}\]])", r"\1", texte)]
+    essais.append(essais[-1].replace("'", '"'))
+    for essai in essais:
+        try:
+            return json.loads(essai)
+        except ValueError:
+            continue
+    return None
+
+
+def _corriger_valeur(valeur, schema: dict):
+    if schema.get("type") == "boolean" and isinstance(valeur, str):
+        v = valeur.strip().lower()
+        if v in ("true", "vrai", "oui", "yes", "1"):
+            return True
+        if v in ("false", "faux", "non", "no", "0"):
+            return False
+    if schema.get("type") == "string" and isinstance(valeur, (int, float)) and not isinstance(valeur, bool):
+        valeur = str(valeur)
+    if "enum" in schema and isinstance(valeur, str) and valeur not in schema["enum"]:
+        proches = [e for e in schema["enum"] if e.lower() == valeur.strip().strip('"').lower()]
+        if len(proches) == 1:
+            return proches[0]
+    return valeur
+
+
+def reparer(texte: str, schema: dict) -> Optional[dict]:
+    """Tente de transformer une sortie invalide en objet conforme au schéma."""
+    obj = _charger(texte)
+    proprietes = schema.get("properties", {})
+    requis = schema.get("required", [])
+
+    # Texte brut (pas de JSON): acceptable si un seul champ texte est attendu
+    if not isinstance(obj, dict):
+        if len(requis) != 1 or proprietes.get(requis[0], {}).get("type") != "string":
+            return None
+        brut = obj if isinstance(obj, str) else texte.strip()
+        enum = proprietes[requis[0]].get("enum")
+        if enum:
+            trouves = [e for e in enum if re.search(rf"\b{re.escape(e)}\b", brut, re.IGNORECASE)]
+            if len(trouves) != 1:
+                return None
+            brut = trouves[0]
+        obj = {requis[0]: brut}
+
+    obj = dict(obj)
+    for cle in requis:
+        if cle not in obj:
+            # Champ mal nommé: on reprend l'unique valeur du bon type non réclamée
+            type_cle = _TYPES.get(proprietes.get(cle, {}).get("type"))
+            libres = [k for k, v in obj.items() if k not in proprietes and isinstance(v, type_cle or object)]
+            if len(libres) == 1:
+                obj[cle] = obj.pop(libres[0])
+    for cle, sous_schema in proprietes.items():
+        if cle in obj:
+            obj[cle] = _corriger_valeur(obj[cle], sous_schema)
+
+    return obj if valider(obj, schema) else None
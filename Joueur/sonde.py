@@ -0,0 +1,118 @@
+"""Sonde de température locale (Raspberry Pi) lue via sysfs.
+
+Deux familles d'interfaces Linux sont prises en charge:
+
+- 1-Wire (DS18B20...): /sys/bus/w1/devices/28-*/temperature (millidegrés)
+  ou, sur les noyaux plus anciens, w1_slave (« ... t=23125 »);
+- IIO (capteurs I2C: BME280, TMP102, SHT3x...):
+  /sys/bus/iio/devices/iio:device*/in_temp_input (millidegrés) ou
+  in_temp_raw avec in_temp_offset / in_temp_scale.
+
+Un thread échantillonne la sonde à intervalle régulier dans un tampon
+circulaire de taille fixe; une lecture ne touche donc jamais au matériel et
+rend la médiane des derniers échantillons (lissage robuste aux pics). Les
+échantillons de plus de PERIODES_PEREMPTION périodes sont ignorés: une
+sonde qui ne répond plus ne donne pas de valeur figée. La racine de sysfs est paramétrable pour utiliser des fichiers factices.
+"""
+from __future__ import annotations
+import glob
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+PERIODE_ECHANTILLONNAGE = 1.0
+TAILLE_TAMPON = 32
+FENETRE_LISSAGE = 8
+PERIODES_PEREMPTION = 5
+
+
+class Sonde:
+    """Un fichier de température sysfs et la façon de le convertir en °C."""
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+
+    def _lire_fichier(self, nom: str) -> str:
+        with open(os.path.join(self.chemin, nom), encoding="ascii") as f:
+            return f.read().strip()
+
+    def lire(self) -> float:
+        """Température en °C; OSError/ValueError si la sonde ne répond pas."""
+        fichiers = set(os.listdir(self.chemin))
+        if "temperature" in fichiers:
+            return int(self._lire_fichier("temperature")) / 1000
+        if "w1_slave" in fichiers:
+            lignes = self._lire_fichier("w1_slave").splitlines()
+            if len(lignes) < 2 or not lignes[0].endswith("YES") or "t=" not in lignes[1]:
+                raise ValueError(f"lecture 1-Wire invalide: {self.chemin}")
+            return int(lignes[1].rsplit("t=", 1)[1]) / 1000
+        if "in_temp_input" in fichiers:
+            return float(self._lire_fichier("in_temp_input")) / 1000
+        if "in_temp_raw" in fichiers:
+            brut = float(self._lire_fichier("in_temp_raw"))
+            decalage = float(self._lire_fichier("in_temp_offset")) if "in_temp_offset" in fichiers else 0.0
+            echelle = float(self._lire_fichier("in_temp_scale")) if "in_temp_scale" in fichiers else 1.0
+            return (brut + decalage) * echelle / 1000
+        raise ValueError(f"aucune mesure de temperature dans {self.chemin}")
+
+    def __repr__(self):
+        return f"Sonde({self.chemin})"
+
+
+def trouver_sondes(racine: str = "/sys") -> List[Sonde]:
+    """Sondes 1-Wire puis IIO présentes sous la racine sysfs donnée."""
+    chemins = sorted(glob.glob(os.path.join(racine, "bus/w1/devices/28-*")))
+    for dossier in sorted(glob.glob(os.path.join(racine, "bus/iio/devices/iio:device*"))):
+        if any(os.path.exists(os.path.join(dossier, f)) for f in ("in_temp_input", "in_temp_raw")):
+            chemins.append(dossier)
+    return [Sonde(c) for c in chemins]
+
+
+class Echantillonneur:
+    """Échantillonne une sonde en tâche de fond et sert des lectures lissées."""
+
+    def __init__(self, sonde: Sonde, periode: float = PERIODE_ECHANTILLONNAGE,
+                 taille: int = TAILLE_TAMPON, log: Callable[[str], None] = print):
+        self.sonde = sonde
+        self.periode = periode
+        self.log = log
+        self.tampon = deque(maxlen=taille)  # (instant, température)
+        self._verrou = threading.Lock()
+        self._arret = threading.Event()
+        self._thread = None
+
+    def demarrer(self) -> "Echantillonneur":
+        if self._thread is None:
+            self.echantillonner()  # première valeur disponible tout de suite
+            self._thread = threading.Thread(target=self._boucle, name="sonde", daemon=True)
+            self._thread.start()
+        return self
+
+    def arreter(self) -> None:
+        self._arret.set()
+
+    def echantillonner(self) -> None:
+        try:
+            temp = self.sonde.lire()
+        except (OSError, ValueError) as e:
+            self.log(f"[SONDE] Lecture impossible ({self.sonde.chemin}): {e}")
+            return
+        with self._verrou:
+            self.tampon.append((time.time(), temp))
+
+    def _boucle(self) -> None:
+        while not self._arret.wait(self.periode):
+            self.echantillonner()
+
+    def lecture(self, fenetre: int = FENETRE_LISSAGE) -> Optional[float]:
+        """Médiane des derniers échantillons récents; None si la sonde ne donne rien."""
+        limite = time.time() - PERIODES_PEREMPTION * self.periode
+        with self._verrou:
+            valeurs = sorted(t for instant, t in list(self.tampon)[-fenetre:] if instant >= limite)
+        if not valeurs:
+            return None
+        milieu = len(valeurs) // 2
+        mediane = valeurs[milieu] if len(valeurs) % 2 else (valeurs[milieu - 1] + valeurs[milieu]) / 2
+        return round(mediane, 2)
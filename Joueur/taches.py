@@ -0,0 +1,95 @@
+"""Petit pool de travailleurs pour les traitements déclenchés par MQTT.
+
+Chaque tâche a un type ("releve", "vote", ...). Une seule tâche d'un type
+donné peut être en attente ou en cours: les soumissions suivantes sont
+ignorées, ce qui évite les votes en double déclenchés par chaque
+température reçue. remplacer=True substitue une tâche encore en attente
+(par exemple un vote planifié sans échéance par la demande de vote du
+serveur, qui en porte une). Les tâches différées remplacent les
+threading.Timer: un seul thread planificateur pour tout le pool.
+"""
+from __future__ import annotations
+import heapq
+import itertools
+import queue
+import threading
+import time
+from typing import Callable, Dict
+
+EN_COURS = "en_cours"
+
+
+class PoolTaches:
+    """nb_travailleurs threads qui exécutent les tâches planifiées, une par type à la fois."""
+
+    def __init__(self, nb_travailleurs: int = 4, log: Callable[[str], None] = print):
+        self.log = log
+        self._file: queue.Queue = queue.Queue()
+        self._planifiees = []  # tas de (instant, jeton, type, fn, args, kwargs)
+        self._etats: Dict[str, object] = {}  # type -> jeton en attente ou EN_COURS
+        self._jetons = itertools.count()
+        self._condition = threading.Condition()
+        self._actif = True
+        self.nb_travailleurs = nb_travailleurs
+        threading.Thread(target=self._planifier, name="taches-planif", daemon=True).start()
+        for i in range(nb_travailleurs):
+            threading.Thread(target=self._travailler, name=f"taches-{i}", daemon=True).start()
+
+    def soumettre(self, type_tache: str, fn: Callable, *args, delai: float = 0.0,
+                  remplacer: bool = False, **kwargs) -> bool:
+        """Planifie fn(*args, **kwargs) dans delai secondes.
+
+        Retourne False si une tâche du même type est déjà en cours, ou en
+        attente sans remplacer=True.
+        """
+        with self._condition:
+            etat = self._etats.get(type_tache)
+            if etat == EN_COURS or (etat is not None and not remplacer):
+                return False
+            jeton = next(self._jetons)
+            self._etats[type_tache] = jeton
+            heapq.heappush(self._planifiees, (time.time() + delai, jeton, type_tache, fn, args, kwargs))
+            self._condition.notify()
+        return True
+
+    def occupe(self, type_tache: str) -> bool:
+        """Vrai si une tâche de ce type est en attente ou en cours."""
+        with self._condition:
+            return type_tache in self._etats
+
+    def arreter(self) -> None:
+        with self._condition:
+            self._actif = False
+            self._condition.notify_all()
+
+    def _planifier(self) -> None:
+        while True:
+            with self._condition:
+                while self._actif and (not self._planifiees or self._planifiees[0][0] > time.time()):
+                    attente = self._planifiees[0][0] - time.time() if self._planifiees else None
+                    self._condition.wait(attente)
+                if not self._actif:
+                    for _ in range(self.nb_travailleurs):
+                        self._file.put(None)
+                    return
+                tache = heapq.heappop(self._planifiees)
+            self._file.put(tache)
+
+    def _travailler(self) -> None:
+        while True:
+            tache = self._file.get()
+            if tache is None:
+                return
+            _, jeton, type_tache, fn, args, kwargs = tache
+            with self._condition:
+                # Tâche remplacée entre-temps
+                if self._etats.get(type_tache) != jeton:
+                    continue
+                self._etats[type_tache] = EN_COURS
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.log(f"[TACHE] {type_tache} en echec: {e}")
+            finally:
+                with self._condition:
+                    self._etats.pop(type_tache, None)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les modules du joueur s'importent à plat (import prompts, import sonde...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+from ollama_client import Disjoncteur
+
+
+def ouvrir(disj):
+    for _ in range(disj.min_appels):
+        disj.enregistrer(0.1, False)
+
+
+def test_ferme_puis_ouvert_apres_min_appels():
+    disj = Disjoncteur(slo_latence=1.0, min_appels=3)
+    assert disj.enregistrer(0.1, False) is None
+    assert disj.enregistrer(0.1, False) is None
+    assert disj.autorise() and disj.est_ferme()
+    assert disj.enregistrer(0.1, False) == Disjoncteur.OUVERT
+    assert not disj.autorise()
+    assert not disj.est_ferme()
+
+
+def test_succes_trop_lent_compte_comme_echec():
+    disj = Disjoncteur(slo_latence=1.0, min_appels=3)
+    for _ in range(3):
+        disj.enregistrer(2.0, True)
+    assert disj.etat == Disjoncteur.OUVERT
+
+
+def test_semi_ouvert_un_seul_essai_puis_ferme():
+    disj = Disjoncteur(slo_latence=1.0, min_appels=3, delai_reessai=0.0)
+    ouvrir(disj)
+    assert disj.autorise()
+    assert disj.etat == Disjoncteur.SEMI_OUVERT
+    assert not disj.autorise()
+    assert not disj.est_ferme()
+    assert disj.enregistrer(0.1, True) == Disjoncteur.FERME
+    assert len(disj.appels) == 0
+    assert disj.autorise()
+
+
+def test_semi_ouvert_echec_rouvre():
+    disj = Disjoncteur(slo_latence=1.0, min_appels=3, delai_reessai=60.0)
+    ouvrir(disj)
+    disj.ouvert_depuis -= 60.0
+    assert disj.autorise()
+    assert disj.enregistrer(0.1, False) == Disjoncteur.OUVERT
+    assert not disj.autorise()
+
+
+def test_abandonner_libere_l_essai():
+    disj = Disjoncteur(slo_latence=1.0, min_appels=3, delai_reessai=0.0)
+    ouvrir(disj)
+    assert disj.autorise()
+    disj.abandonner()
+    assert disj.etat == Disjoncteur.SEMI_OUVERT
+    assert disj.autorise()
@@ -0,0 +1,35 @@
+import time
+
+import ensemble
+
+
+def test_quorum_rendu_sans_attendre_et_vote_tardif_enregistre():
+    def lent():
+        time.sleep(0.3)
+        return "b"
+
+    debut = time.time()
+    suspect, votes = ensemble.voter_ensemble(
+        {"rapide1": lambda: "a", "rapide2": lambda: "a", "lent": lent},
+        {"rapide1": 1.0, "rapide2": 1.0, "lent": 1.0}, quorum=0.5, log=lambda m: None)
+    assert suspect == "a"
+    assert time.time() - debut < 0.2
+    assert "lent" not in votes
+
+    time.sleep(0.5)
+    assert votes == {"rapide1": "a", "rapide2": "a", "lent": "b"}
+    precision = ensemble.PrecisionModeles()
+    precision.enregistrer(votes, "a")
+    assert precision.poids("lent") < 0.5 < precision.poids("rapide1")
+
+
+def test_echeance_sans_quorum():
+    def lent():
+        time.sleep(0.3)
+        return "b"
+
+    suspect, votes = ensemble.voter_ensemble({"x": lambda: "a", "y": lent}, {"x": 1.0, "y": 2.0},
+                                             quorum=0.5, echeance=time.time() + 0.1, log=lambda m: None)
+    assert suspect == "a"
+    time.sleep(0.4)
+    assert votes["y"] == "b"
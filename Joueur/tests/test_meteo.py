@@ -0,0 +1,64 @@
+import threading
+import time
+
+import meteo
+from geocodage import IndexGeocodage
+
+
+class FournisseurCompte(meteo.FournisseurMeteo):
+    nom = "compte"
+
+    def __init__(self):
+        self.appels = 0
+        self.ferme = 0
+
+    def temperatures(self, coords):
+        self.appels += 1
+        time.sleep(0.05)
+        return {ville: 10.0 for ville in coords}
+
+    def fermer(self):
+        self.ferme += 1
+
+
+def service(fournisseur):
+    return meteo.ServiceMeteo(None, log=lambda m: None, index=IndexGeocodage(fichier=None, log=lambda m: None),
+                              fournisseur=fournisseur)
+
+
+def test_prechargement_unique_entre_bots():
+    fournisseur = FournisseurCompte()
+    svc = service(fournisseur)
+    resultats = []
+    fils = [threading.Thread(target=lambda: resultats.append(svc.precharger(["Lyon", "Annecy"])))
+            for _ in range(10)]
+    for fil in fils:
+        fil.start()
+    for fil in fils:
+        fil.join()
+    assert fournisseur.appels == 1
+    assert all(r == {"Lyon": 10.0, "Annecy": 10.0} for r in resultats)
+
+    # Seules les villes absentes du cache sont demandées
+    svc.precharger(["Lyon", "Grenoble"])
+    assert fournisseur.appels == 2
+
+
+def test_changer_fournisseur_ferme_une_seule_fois():
+    ancien = FournisseurCompte()
+    svc = service(ancien)
+    fils = [threading.Thread(target=svc.changer_fournisseur, args=("synthetique:1",)) for _ in range(10)]
+    for fil in fils:
+        fil.start()
+    for fil in fils:
+        fil.join()
+    assert ancien.ferme == 1
+    assert isinstance(svc.fournisseur, meteo.SynthetiqueMeteo)
+
+
+def test_synthetique_reproductible():
+    coords = {"Lyon": (45.7485, 4.8467), "Annecy": (45.8992, 6.1294)}
+    assert meteo.SynthetiqueMeteo(7).temperatures(coords) == meteo.SynthetiqueMeteo(7).temperatures(coords)
+    assert meteo.SynthetiqueMeteo(7).temperatures(coords) != meteo.SynthetiqueMeteo(8).temperatures(coords)
+    nuit = meteo.SynthetiqueMeteo(7, horloge=lambda: time.mktime((2025, 1, 1, 3, 0, 0, 0, 0, -1)))
+    assert nuit.temperatures(coords)["Lyon"] < meteo.SynthetiqueMeteo(7).temperatures(coords)["Lyon"]
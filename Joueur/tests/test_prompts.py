@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+import prompts
+
+ENTETE = "Tu es un detective. Temperatures par capteur (lignes) et par round (colonnes):"
+CONSIGNE = "Reponds uniquement en JSON avec le champ 'espion_presume'."
+
+
+def historique(nb_joueurs, nb_rounds):
+    rng = random.Random(0)
+    return {f"j{i}": [round(rng.uniform(5, 25), 1) for _ in range(nb_rounds)]
+            for i in range(nb_joueurs)}
+
+
+@pytest.mark.parametrize("nb_rounds", [5, 20, 50, 200])
+def test_prompt_10_joueurs_tient_dans_le_contexte(nb_rounds):
+    prompt, options = prompts.construire_prompt(ENTETE, historique(10, nb_rounds), CONSIGNE, "gemma3:4b")
+    limite = options["num_ctx"] - options["num_predict"] - prompts.MARGE_TOKENS
+    # Minorant du coût réel: chaque chiffre et séparateur est au moins un token
+    unitaires = sum(1 for c in prompt if c in prompts.CARACTERES_UNITAIRES)
+    assert unitaires <= prompts.estimer_tokens(prompt) <= limite
+    assert prompt.startswith(ENTETE) and prompt.endswith(CONSIGNE)
+
+
+def test_texte_libre_tronque_au_budget():
+    prompt, options = prompts.construire_prompt(ENTETE, historique(10, 50), CONSIGNE, "gemma3:4b",
+                                                texte_libre="defense " * 1000)
+    limite = options["num_ctx"] - options["num_predict"] - prompts.MARGE_TOKENS
+    assert prompts.estimer_tokens(prompt) <= limite
+    assert prompt.endswith(CONSIGNE)
@@ -0,0 +1,51 @@
+from releves import MagasinReleves
+
+
+def test_enregistrer_idempotent():
+    magasin = MagasinReleves(3)
+    assert magasin.enregistrer("a", 1, 12.5, "Lyon")
+    version = magasin.version
+    # Redélivrance QoS 1: rien ne change
+    assert not magasin.enregistrer("a", 1, 12.5, "Lyon")
+    assert magasin.version == version
+    # Correction d'une valeur: prise en compte
+    assert magasin.enregistrer("a", 1, 13.0, "Lyon")
+    assert magasin.version == version + 1
+    assert magasin.serie("a") == [13.0]
+
+
+def test_rounds_dans_le_desordre():
+    magasin = MagasinReleves(3)
+    magasin.enregistrer("a", 3, 15.0, "Annecy")
+    assert magasin.serie("a") == [None, None, 15.0]
+    assert magasin.rounds_complets() == 0
+    magasin.enregistrer("a", 1, 11.0, "Lyon")
+    assert magasin.rounds_complets() == 1
+    magasin.enregistrer("a", 2, 13.0, "Grenoble")
+    assert magasin.rounds_complets() == 3
+    assert magasin.villes("a") == ["Lyon", "Grenoble", "Annecy"]
+
+
+def test_complet_jusqua():
+    magasin = MagasinReleves(2)
+    assert not magasin.complet_jusqua(1)
+    magasin.enregistrer("a", 1, 10.0)
+    magasin.enregistrer("b", 1, 11.0)
+    magasin.enregistrer("a", 2, 12.0)
+    assert magasin.complet_jusqua(1)
+    assert not magasin.complet_jusqua(2)
+    assert magasin.complet_jusqua(2, joueurs=["a"])
+    # Un capteur inconnu compte comme n'ayant rien envoyé
+    assert not magasin.complet_jusqua(1, joueurs=["a", "c"])
+    magasin.enregistrer("b", 2, 13.0)
+    assert magasin.complet_jusqua(2)
+
+
+def test_rounds_au_dela_de_la_partie_et_vider():
+    magasin = MagasinReleves(2)
+    magasin.enregistrer("a", 4, 9.0)
+    assert magasin.serie("a") == [None, None, None, 9.0]
+    assert magasin.series(exclure=["a"]) == {}
+    magasin.vider()
+    assert magasin.series() == {}
+    assert magasin.rounds_complets() == 0
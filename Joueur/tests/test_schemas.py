@@ -0,0 +1,35 @@
+import pytest
+
+import schemas
+
+VOTE = schemas.schema_vote(["Alice", "bob"], avec_analyse=True)
+
+
+@pytest.mark.parametrize("texte", [
+    '```json\n{"espion_presume": "Alice", "credible": true, "analyse": "ok"}\n```',
+    'Voici mon vote: {"espion_presume": "Alice", "credible": true, "analyse": "ok",}',
+    "{'espion_presume': 'Alice', 'credible': true, 'analyse': 'ok'}",
+    '{"suspect": "Alice", "credible": true, "analyse": "ok"}',
+    '{"espion_presume": "Alice", "credible": "oui", "analyse": "ok"}',
+    '{"espion_presume": "alice", "credible": true, "analyse": "ok"}',
+])
+def test_reparer_sorties_approchantes(texte):
+    assert schemas.reparer(texte, VOTE) == {"espion_presume": "Alice", "credible": True, "analyse": "ok"}
+
+
+def test_reparer_texte_brut_champ_unique():
+    assert schemas.reparer("Je n'étais pas à Lyon.", schemas.DEFENSE) == {"defense": "Je n'étais pas à Lyon."}
+    vote = schemas.schema_vote(["Alice", "bob"])
+    assert schemas.reparer("Je vote contre BOB.", vote) == {"espion_presume": "bob"}
+    # Ambigu: deux candidats cités
+    assert schemas.reparer("Alice ou bob ?", vote) is None
+
+
+@pytest.mark.parametrize("texte", [
+    "pas de json",
+    '{"espion_presume": "Carole", "credible": true, "analyse": "ok"}',
+    '{"espion_presume": "Alice", "credible": "peut-être", "analyse": "ok"}',
+    '{"espion_presume": "Alice"}',
+])
+def test_reparer_refuse_les_sorties_invalides(texte):
+    assert schemas.reparer(texte, VOTE) is None
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+import meteo
+import sonde
+
+
+def ecrire(dossier, **fichiers):
+    dossier.mkdir(parents=True, exist_ok=True)
+    for nom, contenu in fichiers.items():
+        (dossier / nom).write_text(contenu, encoding="ascii")
+    return dossier
+
+
+def test_one_wire_temperature(tmp_path):
+    dossier = ecrire(tmp_path / "bus/w1/devices/28-000001", temperature="21375\n")
+    assert sonde.Sonde(str(dossier)).lire() == 21.375
+
+
+def test_one_wire_w1_slave_crc_ok(tmp_path):
+    dossier = ecrire(tmp_path / "28-000002", w1_slave=(
+        "72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n"
+        "72 01 4b 46 7f ff 0e 10 57 t=23125\n"))
+    assert sonde.Sonde(str(dossier)).lire() == 23.125
+
+
+def test_one_wire_w1_slave_crc_ko(tmp_path):
+    dossier = ecrire(tmp_path / "28-000003", w1_slave=(
+        "72 01 4b 46 7f ff 0e 10 57 : crc=00 NO\n"
+        "72 01 4b 46 7f ff 0e 10 57 t=23125\n"))
+    with pytest.raises(ValueError):
+        sonde.Sonde(str(dossier)).lire()
+
+
+def test_iio_brut_decalage_echelle(tmp_path):
+    dossier = ecrire(tmp_path / "bus/iio/devices/iio:device0",
+                     in_temp_raw="500\n", in_temp_offset="-100\n", in_temp_scale="62.5\n")
+    assert sonde.Sonde(str(dossier)).lire() == 25.0
+
+
+def test_trouver_sondes(tmp_path):
+    ecrire(tmp_path / "bus/w1/devices/28-000001", temperature="20000")
+    ecrire(tmp_path / "bus/iio/devices/iio:device0", in_temp_input="19000")
+    ecrire(tmp_path / "bus/iio/devices/iio:device1", in_voltage0_raw="12")
+    chemins = [s.chemin for s in sonde.trouver_sondes(str(tmp_path))]
+    assert [c.rsplit("/", 1)[-1] for c in chemins] == ["28-000001", "iio:device0"]
+
+
+def test_echantillonneur_mediane(tmp_path):
+    dossier = ecrire(tmp_path / "28-000004", temperature="20000")
+    echantillonneur = sonde.Echantillonneur(sonde.Sonde(str(dossier)), log=lambda m: None)
+    for milli in ("20000", "21000", "85000", "22000", "21500"):
+        (dossier / "temperature").write_text(milli)
+        echantillonneur.echantillonner()
+    # Le pic à 85 °C est écarté par la médiane
+    assert echantillonneur.lecture() == 21.5
+    assert echantillonneur.lecture(fenetre=2) == 21.75
+
+
+def test_echantillonneur_ignore_les_echantillons_perimes(tmp_path):
+    dossier = ecrire(tmp_path / "28-000005", temperature="20000")
+    echantillonneur = sonde.Echantillonneur(sonde.Sonde(str(dossier)), periode=1.0, log=lambda m: None)
+    echantillonneur.echantillonner()
+    assert echantillonneur.lecture() == 20.0
+    echantillonneur.tampon[0] = (time.time() - 10 * sonde.PERIODES_PEREMPTION, 20.0)
+    assert echantillonneur.lecture() is None
+
+
+def test_changer_fournisseur_arrete_la_sonde(tmp_path):
+    dossier = ecrire(tmp_path / "28-000006", temperature="20000")
+    service = meteo.ServiceMeteo(None, log=lambda m: None,
+                                 fournisseur=meteo.fabriquer_fournisseur(f"sonde:{dossier}"))
+    service.description = f"sonde:{dossier}"
+    fil = service.fournisseur.echantillonneur._thread
+    service.changer_fournisseur("synthetique:1")
+    fil.join(timeout=2)
+    assert not fil.is_alive()
@@ -0,0 +1,76 @@
+import threading
+import time
+
+from taches import PoolTaches
+
+
+def attendre(condition, delai=2.0):
+    fin = time.time() + delai
+    while not condition() and time.time() < fin:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_une_seule_tache_par_type():
+    pool = PoolTaches(2, log=lambda m: None)
+    liberer = threading.Event()
+    executees = []
+
+    def tache(n):
+        executees.append(n)
+        liberer.wait(2)
+
+    try:
+        assert pool.soumettre("vote", tache, 1)
+        assert attendre(lambda: executees == [1])
+        # En cours: même remplacer=True est refusé
+        assert not pool.soumettre("vote", tache, 2)
+        assert not pool.soumettre("vote", tache, 3, remplacer=True)
+        # Un autre type passe
+        assert pool.soumettre("releve", executees.append, "r")
+        assert attendre(lambda: "r" in executees)
+        liberer.set()
+        assert attendre(lambda: not pool.occupe("vote"))
+        assert executees == [1, "r"]
+    finally:
+        pool.arreter()
+
+
+def test_remplacer_une_tache_en_attente():
+    pool = PoolTaches(2, log=lambda m: None)
+    executees = []
+    try:
+        assert pool.soumettre("vote", executees.append, "sans echeance", delai=0.2)
+        assert not pool.soumettre("vote", executees.append, "ignoree")
+        assert pool.soumettre("vote", executees.append, "avec echeance", delai=0.05, remplacer=True)
+        assert attendre(lambda: not pool.occupe("vote"))
+        time.sleep(0.3)  # l'ancienne tâche arrive à échéance mais ne s'exécute pas
+        assert executees == ["avec echeance"]
+    finally:
+        pool.arreter()
+
+
+def test_delai_respecte_et_ordre_des_echeances():
+    pool = PoolTaches(1, log=lambda m: None)
+    instants = {}
+    debut = time.time()
+    try:
+        pool.soumettre("b", lambda: instants.setdefault("b", time.time() - debut), delai=0.2)
+        pool.soumettre("a", lambda: instants.setdefault("a", time.time() - debut), delai=0.05)
+        assert attendre(lambda: len(instants) == 2)
+        assert 0.05 <= instants["a"] < instants["b"]
+        assert instants["b"] >= 0.2
+    finally:
+        pool.arreter()
+
+
+def test_echec_libere_le_type():
+    messages = []
+    pool = PoolTaches(1, log=messages.append)
+    try:
+        pool.soumettre("vote", lambda: 1 / 0)
+        assert attendre(lambda: not pool.occupe("vote"))
+        assert messages and "vote" in messages[0]
+        assert pool.soumettre("vote", lambda: None)
+    finally:
+        pool.arreter()
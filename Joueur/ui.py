@@ -1,6 +1,24 @@
+import functools
 import pygame
 from pygame.locals import *
 
+# Surfaces de texte déjà rendues, par (police, texte, couleur): le rendu des
+# polices domine le temps d'une frame sur Raspberry Pi
+TAILLE_CACHE_TEXTE = 512
+TAILLE_CACHE_LIGNES = 64
+
+
+@functools.lru_cache(maxsize=TAILLE_CACHE_TEXTE)
+def rendre_texte(font, text, color):
+    """font.render(text, True, color) mis en cache (color doit être un tuple)."""
+    return font.render(text, True, color)
+
+
+@functools.lru_cache(maxsize=TAILLE_CACHE_LIGNES)
+def lignes_texte(text, font, max_width):
+    """wrap_text mis en cache: découpage d'un texte long calculé une seule fois."""
+    return tuple(wrap_text(text, font, max_width))
+
 
 def wrap_text(text, font, max_width):
     words = text.split()
@@ -41,11 +59,103 @@ def init_ui(capteur, nb_rounds):
             capteur.avatar_images[idx] = surf
 
 
+# Zones de l'écran redessinées séparément (voir zones_modifiees)
+ZONE_ENTETE = pygame.Rect(0, 0, 1200, 200)
+ZONE_RESULTATS = pygame.Rect(250, 80, 700, 400)
+HAUT_COLONNES = 175
+
+
+def _disposition(capteur):
+    """Identifiants affichés et géométrie des colonnes (une par capteur)."""
+    all_capteurs = sorted(list(capteur.all_capteurs) + [capteur.id])
+    num = len(all_capteurs)
+    screen_w = capteur.screen.get_width()
+    spacing = screen_w // max(num, 1)
+    return all_capteurs, spacing, (screen_w - num * spacing) // 2
+
+
+def _etat_colonne(capteur, cid):
+    """Tout ce qu'affiche la colonne d'un capteur: elle est à redessiner si cela change."""
+    results = capteur.results or {}
+    temps = capteur.mes_temperatures if cid == capteur.id else capteur.temperatures.get(cid, [])
+    defense = None
+    if capteur.defense_recue and capteur.defense_recue.get('capteur_id') == cid:
+        defense = capteur.defense_recue.get('defense', '')
+    return (capteur.assign_avatar_index(cid), tuple(temps), results.get('espion') == cid,
+            results.get('accuse') == cid, results.get('votes', {}).get(cid),
+            results.get('votes_round2', {}).get(cid), defense)
+
+
+def zones_modifiees(capteur, nb_rounds):
+    """Rectangles dont le contenu a changé depuis la frame précédente.
+
+    Zones suivies: en-tête, une colonne par capteur, panneau de résultats.
+    Un changement de rôle (fond) ou du nombre de capteurs redessine tout.
+    """
+    precedent = getattr(capteur, "etat_zones", None) or {}
+    all_capteurs, spacing, x0 = _disposition(capteur)
+    hauteur = capteur.screen.get_height()
+    results = capteur.results or {}
+
+    etat = {
+        "fond": (capteur.role, tuple(all_capteurs), capteur.screen.get_size()),
+        "entete": (capteur.role, capteur.round_count, capteur.ville),
+        "resultats": tuple(sorted((k, str(v)) for k, v in results.items())),
+    }
+    colonnes = {}
+    for i, cid in enumerate(all_capteurs):
+        etat[("colonne", cid)] = _etat_colonne(capteur, cid)
+        colonnes[("colonne", cid)] = pygame.Rect(x0 + i * spacing, HAUT_COLONNES, spacing, hauteur - HAUT_COLONNES)
+    capteur.etat_zones = etat
+
+    if etat["fond"] != precedent.get("fond"):
+        return [capteur.screen.get_rect()]
+    zones = []
+    if etat["entete"] != precedent.get("entete"):
+        zones.append(ZONE_ENTETE)
+    for cle, rect in colonnes.items():
+        if etat[cle] != precedent.get(cle):
+            zones.append(rect)
+    if etat["resultats"] != precedent.get("resultats") or (results and zones):
+        # Le panneau recouvre l'en-tête et les colonnes: redessiné avec eux
+        zones.append(ZONE_RESULTATS)
+    return zones
+
+
 def draw_frame(capteur, nb_rounds):
-    """Dessine une frame complète pour l'instance Capteur."""
+    """Redessine les zones modifiées et retourne leurs rectangles (pour display.update).
+
+    La scène est dessinée une seule fois, limitée à l'union des zones: ce qui
+    dépasse des zones est inchangé et n'est pas envoyé à l'écran.
+    """
     if not capteur.screen:
-        return
+        return []
+    zones = zones_modifiees(capteur, nb_rounds)
+    if not zones:
+        return []
+    try:
+        capteur.screen.set_clip(zones[0].unionall(zones[1:]))
+        dessiner_tout(capteur, nb_rounds)
+    finally:
+        capteur.screen.set_clip(None)
+    return zones
+
 
+def fond_etoile(capteur, bg):
+    """Fond uni et étoiles, rendus une fois par couleur de rôle puis réutilisés."""
+    fonds = capteur.fonds
+    cle = (bg, capteur.screen.get_size())
+    if cle not in fonds:
+        fond = pygame.Surface(capteur.screen.get_size()).convert()
+        fond.fill(bg)
+        for sx, sy in capteur.stars:
+            pygame.draw.circle(fond, (255, 255, 255), (sx, sy), 1)
+        fonds[cle] = fond
+    return fonds[cle]
+
+
+def dessiner_tout(capteur, nb_rounds):
+    """Dessine une frame complète pour l'instance Capteur (limitée par le clip de l'écran)."""
     # choix de fonds selon rôle
     if capteur.role == "espion":
         bg, accent = (40, 10, 10), (255, 80, 80)
@@ -54,26 +164,20 @@ def draw_frame(capteur, nb_rounds):
     else:
         bg, accent = (10, 10, 40), (80, 80, 255)
 
-    capteur.screen.fill(bg)
-
-    for sx, sy in capteur.stars:
-        pygame.draw.circle(capteur.screen, (255, 255, 255), (sx, sy), 1)
+    capteur.screen.blit(fond_etoile(capteur, bg), (0, 0))
 
     # petits helpers locaux
     def draw_text(text, x, y, color=(255, 255, 255), font=None):
         if not font:
             font = capteur.font_medium
-        text_surf = font.render(text, True, color)
+        text_surf = rendre_texte(font, text, color)
         capteur.screen.blit(text_surf, (x, y))
 
     # dessine avatars et informations
-    all_capteurs = sorted(list(capteur.all_capteurs) + [capteur.id])
-    num = len(all_capteurs)
-    screen_w = capteur.screen.get_width()
-    spacing = screen_w // max(num, 1)
+    all_capteurs, spacing, x0 = _disposition(capteur)
     max_w = max(60, spacing - 60)
 
-    x = (screen_w - num * spacing) // 2 + (spacing - max_w) // 2
+    x = x0 + (spacing - max_w) // 2
     y = 200
 
     for cid in all_capteurs:
@@ -90,13 +194,13 @@ def draw_frame(capteur, nb_rounds):
         rect = scaled.get_rect(x=x, y=y)
         capteur.screen.blit(scaled, rect)
 
-        id_surf = capteur.font_small.render(cid, True, (255, 255, 255))
+        id_surf = rendre_texte(capteur.font_small, cid, (255, 255, 255))
         capteur.screen.blit(id_surf, (x + (rect.width - id_surf.get_width()) // 2, y + rect.height + 6))
 
         is_spy = capteur.results and capteur.results.get('espion') == cid
         is_accused = capteur.results and capteur.results.get('accuse') == cid
         if is_spy:
-            spy_surf = capteur.font_small.render("IMP", True, (255, 0, 0))
+            spy_surf = rendre_texte(capteur.font_small, "IMP", (255, 0, 0))
             capteur.screen.blit(spy_surf, (x + (rect.width - spy_surf.get_width()) // 2, y - 20))
         if is_accused:
             pygame.draw.line(capteur.screen, (255, 0, 0), (x, y), (x + rect.width, y + rect.height), 4)
@@ -105,18 +209,19 @@ def draw_frame(capteur, nb_rounds):
         temps = capteur.mes_temperatures if cid == capteur.id else capteur.temperatures.get(cid, [])
         temp_y = y + rect.height + 30
         for r in range(nb_rounds):
-            temp_str = f"R{r+1}: {temps[r] if r < len(temps) else '--'}"
-            color = (200, 200, 200) if r < len(temps) else (100, 100, 100)
-            text_surf = capteur.font_small.render(temp_str, True, color)
+            recu = r < len(temps) and temps[r] is not None
+            temp_str = f"R{r+1}: {temps[r] if recu else '--'}"
+            color = (200, 200, 200) if recu else (100, 100, 100)
+            text_surf = rendre_texte(capteur.font_small, temp_str, color)
             capteur.screen.blit(text_surf, (x + (rect.width - text_surf.get_width()) // 2, temp_y))
             temp_y += 22
 
         if capteur.results and cid in capteur.results.get('votes', {}):
-            vote_surf = capteur.font_small.render(f"V1: {capteur.results['votes'][cid]}", True, (255, 200, 0))
+            vote_surf = rendre_texte(capteur.font_small, f"V1: {capteur.results['votes'][cid]}", (255, 200, 0))
             capteur.screen.blit(vote_surf, (x + (rect.width - vote_surf.get_width()) // 2, temp_y + 8))
 
         if capteur.results and cid in capteur.results.get('votes_round2', {}):
-            vote_surf = capteur.font_small.render(f"V2: {capteur.results['votes_round2'][cid]}", True, (255, 200, 0))
+            vote_surf = rendre_texte(capteur.font_small, f"V2: {capteur.results['votes_round2'][cid]}", (255, 200, 0))
             capteur.screen.blit(vote_surf, (x + (rect.width - vote_surf.get_width()) // 2, temp_y + 28))
 
         # afficher défense si présente
@@ -124,7 +229,7 @@ def draw_frame(capteur, nb_rounds):
             defense_text = capteur.defense_recue.get('defense', '')
             if defense_text:
                 max_text_w = rect.width
-                lines = wrap_text(defense_text, capteur.font_small, max_text_w)
+                lines = lignes_texte(defense_text, capteur.font_small, max_text_w)
                 box_h = len(lines) * (capteur.font_small.get_linesize() - 4) + 8
                 box_x = x
                 box_y = temp_y + 60
@@ -133,7 +238,7 @@ def draw_frame(capteur, nb_rounds):
                 capteur.screen.blit(s, (box_x - 4, box_y))
                 ly = box_y + 4
                 for line in lines:
-                    txt = capteur.font_small.render(line, True, (255, 255, 255))
+                    txt = rendre_texte(capteur.font_small, line, (255, 255, 255))
                     capteur.screen.blit(txt, (box_x, ly))
                     ly += capteur.font_small.get_linesize() - 4
 
@@ -141,7 +246,7 @@ def draw_frame(capteur, nb_rounds):
 
     # Dessiner les éléments UI supérieurs
     def draw_main_ui():
-        draw_text = lambda t, X, Y, c=(255,255,255), f=None: capteur.screen.blit((f or capteur.font_medium).render(t, True, c), (X,Y))
+        draw_text = lambda t, X, Y, c=(255,255,255), f=None: capteur.screen.blit(rendre_texte(f or capteur.font_medium, t, c), (X,Y))
         # titre
         if capteur.role == "espion":
             accent = (255,80,80)
@@ -177,7 +282,7 @@ def draw_frame(capteur, nb_rounds):
             else:
                 msg = "Impostor Wins!"
                 color = (255,80,80)
-        capteur.screen.blit(capteur.font_medium.render(msg, True, color), (450,150))
-        capteur.screen.blit(capteur.font_small.render(f"Accused R1: {capteur.results.get('accuse_round1','N/A')}", True, (255,255,255)), (450,200))
-        capteur.screen.blit(capteur.font_small.render(f"Accused R2: {capteur.results.get('accuse')}", True, (255,255,255)), (450,230))
-        capteur.screen.blit(capteur.font_small.render(f"Real Impostor: {capteur.results.get('espion')}", True, (255,255,255)), (450,260))
+        capteur.screen.blit(rendre_texte(capteur.font_medium, msg, color), (450,150))
+        capteur.screen.blit(rendre_texte(capteur.font_small, f"Accused R1: {capteur.results.get('accuse_round1','N/A')}", (255,255,255)), (450,200))
+        capteur.screen.blit(rendre_texte(capteur.font_small, f"Accused R2: {capteur.results.get('accuse')}", (255,255,255)), (450,230))
+        capteur.screen.blit(rendre_texte(capteur.font_small, f"Real Impostor: {capteur.results.get('espion')}", (255,255,255)), (450,260))